@@ -0,0 +1,59 @@
+"""Micro-benchmark for the per-poll cost of the change detection in the publish loop.
+
+Run from the repository root: ``PYTHONPATH=src python benchmarks/feature_changed.py``
+"""
+import tempfile
+import timeit
+from pathlib import Path
+from typing import List
+
+from feature_identity import PORT_COUNTS
+from feature_identity import POLLS
+from feature_identity import REPEAT
+from feature_identity import create_unifi_devices
+from unifi_tools.features import FeatureConst
+from unifi_tools.features import FeaturePoEState
+from unifi_tools.features import FeaturePort
+from unifi_tools.unifi import UniFiDevices
+
+
+def poll(features: List[FeaturePort]) -> int:
+    published: int = 0
+
+    # Same as FeaturesMqttPlugin._publish without the MQTT client.
+    for feature in features:
+        if feature.changed:
+            published += len(feature.state.payload) + len(feature.state.json_attributes)
+
+    return published
+
+
+def toggle(unifi_devices: UniFiDevices):
+    for device in unifi_devices.unifi_device_map.values():
+        for port_idx, port in device["ports"].items():
+            poe_mode: str = FeaturePoEState.OFF if port.poe_mode == FeaturePoEState.POE else FeaturePoEState.POE
+            device["ports"][port_idx] = port._replace(poe_mode=poe_mode)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for ports in PORT_COUNTS:
+            unifi_devices: UniFiDevices = create_unifi_devices(Path(tmp) / "settings.yaml", ports)
+            features: List[FeaturePort] = unifi_devices.features[FeatureConst.PORT]
+
+            poll(features)
+            unchanged: float = min(timeit.repeat(lambda: poll(features), number=POLLS, repeat=REPEAT)) / POLLS
+
+            changed: float = min(
+                timeit.repeat(lambda: poll(features), setup=lambda: toggle(unifi_devices), number=1, repeat=POLLS)
+            )
+
+            print(
+                f"{len(features):>6} ports: {unchanged * 1000:8.3f} ms per poll unchanged, {changed * 1000:8.3f} ms all changed"
+            )
+
+            unifi_devices.unifi_api.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Micro-benchmark for the per-poll cost of the FeaturePort identity fields.
+
+Run from the repository root: ``PYTHONPATH=src python benchmarks/feature_identity.py``
+"""
+import tempfile
+import timeit
+from pathlib import Path
+from typing import Final
+from typing import List
+from typing import Tuple
+
+from unifi_tools.config import Config
+from unifi_tools.features import FeatureConst
+from unifi_tools.features import FeaturePort
+from unifi_tools.unifi import UniFiAPI
+from unifi_tools.unifi import UniFiDevice
+from unifi_tools.unifi import UniFiDevices
+from unifi_tools.unifi import UniFiSwitch
+
+PORTS_PER_SWITCH: Final[int] = 50
+PORT_COUNTS: Final[Tuple[int, ...]] = (1_000, 10_000)
+POLLS: Final[int] = 20
+REPEAT: Final[int] = 5
+
+CONFIG: Final[
+    str
+] = """device_info:
+  name: BENCHMARK
+features:
+  {device_id}:
+    id: BENCHMARK_SWITCH
+    ports:
+      - port_idx: 1
+        poe_mode: pasv24
+logging:
+  level: error
+"""
+
+
+def device_id(index: int) -> str:
+    return f"{index:024x}"
+
+
+def device_infos(ports: int, ports_per_switch: int = PORTS_PER_SWITCH) -> List[dict]:
+    return [
+        {
+            "_id": device_id(index),
+            "adopted": True,
+            "name": f"Switch {index}",
+            "model": "US48",
+            "version": "6.2.14.13855",
+            "mac": f"b4:fb:e4:{index >> 16 & 0xFF:02x}:{index >> 8 & 0xFF:02x}:{index & 0xFF:02x}",
+            "cfgversion": f"{index:016x}",
+            "port_overrides": [
+                {
+                    FeatureConst.PORT_IDX: port_idx,
+                    FeatureConst.PORT_NAME: f"Port {port_idx}",
+                    FeatureConst.POE_MODE: "auto",
+                }
+                for port_idx in range(1, ports_per_switch + 1)
+            ],
+        }
+        for index in range(ports // ports_per_switch)
+    ]
+
+
+def create_unifi_devices(config_file_path: Path, ports: int, ports_per_switch: int = PORTS_PER_SWITCH) -> UniFiDevices:
+    config_file_path.write_text(CONFIG.format(device_id=device_id(0)))
+
+    unifi_devices: UniFiDevices = UniFiDevices(unifi_api=UniFiAPI(config=Config(config_file_path=config_file_path)))
+    unifi_devices.unifi_device_map.initialise(device_infos(ports, ports_per_switch))
+
+    for _device_id, device_info in unifi_devices.unifi_device_map.items():
+        UniFiSwitch(
+            unifi_devices=unifi_devices, unifi_device=UniFiDevice(id=_device_id, info=device_info)
+        ).parse_features()
+
+    return unifi_devices
+
+
+def poll(features: List[FeaturePort]):
+    # The fields the publish loop and the Home Assistant discovery read for every port.
+    for feature in features:
+        feature.key
+        feature.device_id
+        feature.unique_id
+        feature.object_id
+        feature.topic
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for ports in PORT_COUNTS:
+            unifi_devices: UniFiDevices = create_unifi_devices(Path(tmp) / "settings.yaml", ports)
+            features: List[FeaturePort] = unifi_devices.features[FeatureConst.PORT]
+
+            seconds: float = min(timeit.repeat(lambda: poll(features), number=POLLS, repeat=REPEAT)) / POLLS
+            print(
+                f"{len(features):>6} ports: {seconds * 1000:8.3f} ms per poll, {seconds / len(features) * 1e9:6.0f} ns per port"
+            )
+
+            unifi_devices.unifi_api.shutdown()
+
+
+if __name__ == "__main__":
+    main()
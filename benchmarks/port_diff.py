@@ -0,0 +1,165 @@
+"""Benchmark for finding the changed ports of a poll: per object, by changed keys and by a NumPy array diff.
+
+Every poll merges a full device payload with ``UniFiDeviceMap.initialise``, where a few switches have a
+new cfgversion and a toggled PoE mode. Each path must find exactly the toggled ports.
+
+The NumPy path is the prototype of a vectorized diff: it compares the PoE mode and name codes of the port
+store with the previous poll and checks only the features of the changed rows. It is skipped without NumPy.
+
+Run from the repository root: ``PYTHONPATH=src python benchmarks/port_diff.py``
+"""
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+from typing import Dict
+from typing import Final
+from typing import List
+from typing import Tuple
+
+from feature_identity import POLLS
+from feature_identity import create_unifi_devices
+from feature_identity import device_infos
+from unifi_tools.features import FeatureConst
+from unifi_tools.features import FeaturePoEState
+from unifi_tools.features import FeaturePort
+from unifi_tools.unifi import UniFiDeviceMap
+from unifi_tools.unifi import UniFiDevices
+
+try:
+    import numpy as np
+
+    HAS_NUMPY: bool = True
+except ImportError:
+    HAS_NUMPY = False
+
+PORT_COUNTS: Final[Tuple[int, ...]] = (10_000, 50_000)
+# Switches that change one port between two polls.
+CHANGES: Final[int] = 10
+
+
+class Poll:
+    """Device payloads of consecutive polls. Every poll toggles port 1 of ``CHANGES`` switches."""
+
+    def __init__(self, ports: int):
+        self.ports: int = ports
+        self.count: int = 0
+        # The configuration changed by earlier polls by device_id.
+        self.cfgversions: Dict[str, str] = {}
+        self.poe_modes: Dict[str, str] = {}
+
+    def payload(self) -> List[dict]:
+        self.count += 1
+        payload: List[dict] = device_infos(self.ports)
+        start: int = self.count % 7
+
+        for device_info in payload[start::7][:CHANGES]:
+            device_id: str = device_info["_id"]
+            # The controller bumps the cfgversion with every configuration change.
+            self.cfgversions[device_id] = f"{device_info['cfgversion']}-{self.count}"
+            self.poe_modes[device_id] = (
+                FeaturePoEState.POE if self.poe_modes.get(device_id) == FeaturePoEState.OFF else FeaturePoEState.OFF
+            )
+
+        for device_info in payload:
+            device_id = device_info["_id"]
+
+            if device_id in self.cfgversions:
+                device_info["cfgversion"] = self.cfgversions[device_id]
+                device_info["port_overrides"][0][FeatureConst.POE_MODE] = self.poe_modes[device_id]
+
+        return payload
+
+
+class ArrayDiff:
+    """Compare the PoE mode and name codes of the port store with the previous poll."""
+
+    def __init__(self, unifi_device_map: UniFiDeviceMap, features: List[FeaturePort]):
+        self.store = unifi_device_map.ports
+        self.poe_mode_codes = self._poe_mode_codes()
+        self.name_codes = self._name_codes()
+        self.features: List[FeaturePort] = [features[0]] * len(self.store)
+
+        for feature in features:
+            device_id, port_idx = feature.key
+            self.features[unifi_device_map[device_id]["ports"].row(port_idx)] = feature
+
+    def _poe_mode_codes(self):
+        return np.frombuffer(self.store.poe_mode_code, dtype=np.uint8).copy()
+
+    def _name_codes(self):
+        return np.frombuffer(self.store.name_code, dtype=np.uint32).copy()
+
+    def changed(self) -> List[FeaturePort]:
+        poe_mode_codes = self._poe_mode_codes()
+        name_codes = self._name_codes()
+        rows = np.nonzero((poe_mode_codes != self.poe_mode_codes) | (name_codes != self.name_codes))[0]
+
+        self.poe_mode_codes = poe_mode_codes
+        self.name_codes = name_codes
+
+        return [self.features[row] for row in rows.tolist()]
+
+
+def measure(unifi_devices: UniFiDevices, poll: Poll, path: Callable[[], int]) -> float:
+    """Return the fastest of ``POLLS`` polls. Merging the payload is not part of the measurement."""
+    # Start from a state where all features are published.
+    path()
+    durations: List[float] = []
+
+    for _ in range(POLLS):
+        unifi_devices.unifi_device_map.initialise(poll.payload())
+
+        started: float = time.perf_counter()
+        changed: int = path()
+        durations.append(time.perf_counter() - started)
+
+        assert CHANGES == changed, f"{changed} changed ports found, expected {CHANGES}"
+
+    return min(durations)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for ports in PORT_COUNTS:
+            unifi_devices: UniFiDevices = create_unifi_devices(Path(tmp) / "settings.yaml", ports)
+            unifi_device_map: UniFiDeviceMap = unifi_devices.unifi_device_map
+            features: List[FeaturePort] = unifi_devices.features[FeatureConst.PORT]
+            poll: Poll = Poll(ports)
+
+            def per_object() -> int:
+                return sum(1 for feature in features if feature.changed)
+
+            def changed_keys() -> int:
+                changed = unifi_device_map.pop_changed()
+                return sum(
+                    1 for feature in unifi_devices.features.by_keys([FeatureConst.PORT], changed) if feature.changed
+                )
+
+            paths: Dict[str, Callable[[], int]] = {
+                "per object": per_object,
+                "changed keys": changed_keys,
+            }
+
+            if HAS_NUMPY:
+                array_diff: ArrayDiff = ArrayDiff(unifi_device_map, features)
+
+                def numpy_diff() -> int:
+                    # The changed keys are not needed, but must not pile up.
+                    unifi_device_map.pop_changed()
+                    return sum(1 for feature in array_diff.changed() if feature.changed)
+
+                paths["numpy diff"] = numpy_diff
+
+            results: Dict[str, float] = {name: measure(unifi_devices, poll, path) for name, path in paths.items()}
+
+            print(
+                f"{len(features):>6} ports, {CHANGES} changed: "
+                + ", ".join(f"{name} {seconds * 1000:7.3f} ms" for name, seconds in results.items())
+            )
+
+            unifi_devices.unifi_api.shutdown()
+
+
+if __name__ == "__main__":
+    main()
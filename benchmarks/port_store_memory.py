@@ -0,0 +1,99 @@
+"""Memory benchmark for the columnar port store compared with one object per port.
+
+Both layouts include the port overrides the PoE commands are built from.
+
+Run from the repository root: ``PYTHONPATH=src python benchmarks/port_store_memory.py``
+"""
+import gc
+import json
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Final
+from typing import List
+from typing import Tuple
+
+from feature_identity import create_unifi_devices
+from feature_identity import device_infos
+from unifi_tools.features import FeatureConst
+from unifi_tools.unifi import UniFiDeviceMap
+from unifi_tools.unifi import UniFiPort
+
+# A campus with 200 switches with 52 ports each.
+SWITCHES: Final[int] = 200
+PORTS_PER_SWITCH: Final[int] = 52
+PORTS: Final[int] = SWITCHES * PORTS_PER_SWITCH
+
+
+def measure(func: Callable[[], Any]) -> Tuple[Any, int]:
+    gc.collect()
+    tracemalloc.start()
+
+    result: Any = func()
+
+    gc.collect()
+    size: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return result, size
+
+
+def object_per_port(payload: str) -> Tuple[Dict[str, dict], Dict[str, List[dict]]]:
+    # The previous layout: a UniFiPort named tuple per port in a dict per device,
+    # and the parsed port overrides of every device for the PoE commands.
+    infos: List[dict] = json.loads(payload)
+    port_overrides: Dict[str, List[dict]] = {device_info["_id"]: device_info["port_overrides"] for device_info in infos}
+    ports: Dict[str, dict] = {
+        device_info["_id"]: {
+            "ports": {
+                port[FeatureConst.PORT_IDX]: UniFiPort(
+                    idx=port[FeatureConst.PORT_IDX],
+                    name=port[FeatureConst.PORT_NAME],
+                    poe_mode=port[FeatureConst.POE_MODE],
+                )
+                for port in device_info["port_overrides"]
+            }
+        }
+        for device_info in infos
+    }
+
+    return ports, port_overrides
+
+
+def port_store(payload: str) -> UniFiDeviceMap:
+    # The columnar store and the port overrides cached as compact JSON.
+    unifi_device_map: UniFiDeviceMap = UniFiDeviceMap()
+    unifi_device_map.initialise(json.loads(payload))
+    # The publish loop consumes the changed ports.
+    unifi_device_map.pop_changed()
+
+    return unifi_device_map
+
+
+def print_size(name: str, size: int, ports: int):
+    print(f"{name:>16}: {size / 1024:9.1f} KiB for {ports} ports, {size / ports:6.1f} bytes per port")
+
+
+def main():
+    # Parse the device list from JSON like a controller response, so the port names are separate strings.
+    payload: str = json.dumps(device_infos(PORTS, PORTS_PER_SWITCH))
+
+    for name, layout in (("object per port", object_per_port), ("columnar store", port_store)):
+        _, size = measure(lambda: layout(payload))
+        print_size(name, size, PORTS)
+
+    # Everything the tool keeps per port, including the FeaturePort objects.
+    with tempfile.TemporaryDirectory() as tmp:
+        unifi_devices, size = measure(
+            lambda: create_unifi_devices(Path(tmp) / "settings.yaml", PORTS, PORTS_PER_SWITCH)
+        )
+        print_size("with features", size, len(unifi_devices.features[FeatureConst.PORT]))
+
+        unifi_devices.unifi_api.shutdown()
+
+
+if __name__ == "__main__":
+    main()
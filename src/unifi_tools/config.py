@@ -1,3 +1,4 @@
+import copy
 import dataclasses
 import logging
 import re
@@ -6,8 +7,10 @@ from dataclasses import dataclass
 from dataclasses import field
 from pathlib import Path
 from typing import Final
+from typing import List
 from typing import Match
 from typing import Optional
+from typing import Tuple
 
 from superbox_utils.config.exception import ConfigException
 from superbox_utils.config.loader import ConfigLoaderMixin
@@ -22,6 +25,13 @@ from unifi_tools.logging import LOG_NAME
 logger: logging.Logger = init_logger(name=LOG_NAME, level="info", handlers=[stream_handler])
 
 
+class FeaturePoEState:
+    ON: str = "on"
+    OFF: str = "off"
+    POE: str = "auto"
+    POE24V: str = "pasv24"
+
+
 class LogPrefix:
     API: Final[str] = "[API]"
     CONFIG: Final[str] = "[CONFIG]"
@@ -43,12 +53,137 @@ class DeviceInfo(ConfigLoaderMixin):
         return value
 
 
+@dataclass
+class HassConfig(HomeAssistantConfig):
+    discovery_qos: int = field(default=2)
+    discovery_window: int = field(default=16)
+    device_discovery: bool = field(default=False)
+
+    @staticmethod
+    def _validate_discovery_qos(value: int, f: dataclasses.Field) -> int:
+        if value not in (0, 1, 2):
+            raise ConfigException(
+                f"[HOMEASSISTANT] Invalid value '{value}' in '{f.name}'. The value must be 0, 1 or 2."
+            )
+
+        return value
+
+    @staticmethod
+    def _validate_discovery_window(value: int, f: dataclasses.Field) -> int:
+        if value < 1:
+            raise ConfigException(
+                f"[HOMEASSISTANT] Invalid value '{value}' in '{f.name}'. The value must be greater than 0."
+            )
+
+        return value
+
+
 @dataclass
 class UniFiControllerConfig(ConfigLoaderMixin):
     url: str = field(default="localhost")
     port: int = field(default=8443)
     username: str = field(default="username")
     password: str = field(default="password")
+    sites: list = field(default_factory=lambda: ["default"])
+    all_sites: bool = field(default=False)
+    site_topics: bool = field(default=False)
+    max_workers: int = field(default=4)
+    thread_pool: bool = field(default=False)
+    session_ttl: int = field(default=0)
+    session_renew_margin: int = field(default=60)
+    session_cache: str = field(default_factory=str)
+    websocket: bool = field(default=False)
+    reconcile_interval: int = field(default=60)
+    poll_min_interval: float = field(default=0.025)
+    poll_max_interval: float = field(default=5.0)
+    cache_max_age: int = field(default=60)
+    command_window: float = field(default=0.05)
+    device_state: bool = field(default=False)
+
+    def validate(self):
+        super().validate()
+
+        if self.poll_max_interval < self.poll_min_interval:
+            raise ConfigException(
+                f"Invalid value '{self.poll_max_interval}' in 'poll_max_interval'. "
+                f"The value must be greater than or equal to 'poll_min_interval'."
+            )
+
+        if self.session_ttl and self.session_renew_margin >= self.session_ttl:
+            raise ConfigException(
+                f"Invalid value '{self.session_renew_margin}' in 'session_renew_margin'. "
+                f"The value must be less than 'session_ttl'."
+            )
+
+    @staticmethod
+    def _validate_sites(value: list, f: dataclasses.Field) -> list:
+        if not value:
+            raise ConfigException(f"Invalid value '{value}' in '{f.name}'. At least one site is required.")
+
+        for site in value:
+            result: Optional[Match[str]] = re.search(Validation.ALLOWED_CHARACTERS.regex, str(site))
+
+            if not isinstance(site, str) or result is None:
+                raise ConfigException(f"Invalid site '{site}' in '{f.name}'. {Validation.ALLOWED_CHARACTERS.error}")
+
+        return value
+
+    @staticmethod
+    def _validate_max_workers(value: int, f: dataclasses.Field) -> int:
+        if value < 1:
+            raise ConfigException(f"Invalid value '{value}' in '{f.name}'. The value must be greater than 0.")
+
+        return value
+
+    @staticmethod
+    def _validate_session_ttl(value: int, f: dataclasses.Field) -> int:
+        if value < 0:
+            raise ConfigException(
+                f"Invalid value '{value}' in '{f.name}'. The value must be greater than or equal to 0."
+            )
+
+        return value
+
+    @staticmethod
+    def _validate_session_renew_margin(value: int, f: dataclasses.Field) -> int:
+        if value < 0:
+            raise ConfigException(
+                f"Invalid value '{value}' in '{f.name}'. The value must be greater than or equal to 0."
+            )
+
+        return value
+
+    @staticmethod
+    def _validate_reconcile_interval(value: int, f: dataclasses.Field) -> int:
+        if value < 1:
+            raise ConfigException(f"Invalid value '{value}' in '{f.name}'. The value must be greater than 0.")
+
+        return value
+
+    @staticmethod
+    def _validate_cache_max_age(value: int, f: dataclasses.Field) -> int:
+        if value < 0:
+            raise ConfigException(
+                f"Invalid value '{value}' in '{f.name}'. The value must be greater than or equal to 0."
+            )
+
+        return value
+
+    @staticmethod
+    def _validate_command_window(value: float, f: dataclasses.Field) -> float:
+        if value < 0:
+            raise ConfigException(
+                f"Invalid value '{value}' in '{f.name}'. The value must be greater than or equal to 0."
+            )
+
+        return value
+
+    @staticmethod
+    def _validate_poll_min_interval(value: float, f: dataclasses.Field) -> float:
+        if value <= 0:
+            raise ConfigException(f"Invalid value '{value}' in '{f.name}'. The value must be greater than 0.")
+
+        return value
 
 
 @dataclass
@@ -56,17 +191,37 @@ class FeatureConfig(ConfigLoaderMixin):
     id: str = field(default_factory=str)
     ports: list = field(default_factory=list)
 
+    @staticmethod
+    def _validate_ports(value: list, f: dataclasses.Field) -> list:
+        for port in value:
+            if not isinstance(port, dict) or not isinstance(port.get("port_idx"), int):
+                raise ConfigException(f"Invalid port in '{f.name}': {port}")
+
+            poe_mode: Optional[str] = port.get("poe_mode")
+            # PoE modes a port can use when it is switched "on".
+            poe_modes: Tuple[str, ...] = (FeaturePoEState.POE, FeaturePoEState.POE24V)
+
+            if poe_mode is not None and poe_mode not in poe_modes:
+                raise ConfigException(
+                    f"Invalid value '{poe_mode}' in 'poe_mode'. The following PoE modes are allowed: {' '.join(poe_modes)}."
+                )
+
+        return value
+
 
 @dataclass
 class Config(ConfigLoaderMixin):
     device_info: DeviceInfo = field(default=DeviceInfo())
     mqtt: MqttConfig = field(default_factory=MqttConfig)
-    homeassistant: HomeAssistantConfig = field(default_factory=HomeAssistantConfig)
+    homeassistant: HassConfig = field(default_factory=HassConfig)
     unifi_controller: UniFiControllerConfig = field(default_factory=UniFiControllerConfig)
+    unifi_controllers: list = field(default_factory=list)
     features: dict = field(default_factory=dict)
     logging: LoggingConfig = field(default_factory=LoggingConfig)
     config_file_path: Path = field(default=Path("/etc/unifi/settings.yaml"))
     systemd_path: Path = field(default=Path("/etc/systemd/system"))
+    # PoE mode for "on" by (device_id, port_idx).
+    port_poe_modes: dict = field(default_factory=dict, init=False)
 
     def __post_init__(self):
         self.update_from_yaml_file(config_path=self.config_file_path)
@@ -75,6 +230,20 @@ class Config(ConfigLoaderMixin):
     def validate(self):
         super().validate()
 
+        for index, controller_data in enumerate(self.unifi_controllers):
+            if isinstance(controller_data, UniFiControllerConfig):
+                continue
+
+            try:
+                controller_config: UniFiControllerConfig = UniFiControllerConfig(**controller_data)
+            except TypeError:
+                raise ConfigException(f"Invalid controller property: {controller_data}")
+
+            controller_config.validate()
+            self.unifi_controllers[index] = controller_config
+
+        self.port_poe_modes.clear()
+
         for device_id, feature_data in self.features.items():
             try:
                 feature_config: FeatureConfig = FeatureConfig(**feature_data)
@@ -82,3 +251,21 @@ class Config(ConfigLoaderMixin):
                 self.features[device_id] = feature_config
             except TypeError:
                 raise ConfigException(f"Invalid feature property: {feature_data}")
+
+            for port in feature_config.ports:
+                if port.get("poe_mode"):
+                    self.port_poe_modes.setdefault((device_id, port["port_idx"]), port["poe_mode"])
+
+    def get_controller_configs(self) -> List["Config"]:
+        """Return a config per UniFi controller. All configs share everything except ``unifi_controller``."""
+        if not self.unifi_controllers:
+            return [self]
+
+        controller_configs: List[Config] = []
+
+        for controller_config in self.unifi_controllers:
+            config: Config = copy.copy(self)
+            config.unifi_controller = controller_config
+            controller_configs.append(config)
+
+        return controller_configs
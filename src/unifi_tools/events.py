@@ -0,0 +1,99 @@
+import asyncio
+import json
+import ssl
+from json import JSONDecodeError
+from typing import Callable
+from typing import Dict
+from typing import Final
+from typing import Optional
+from typing import Tuple
+
+from unifi_tools.config import Config
+from unifi_tools.config import LogPrefix
+from unifi_tools.config import logger
+from unifi_tools.unifi import DEFAULT_SITE
+
+try:
+    import websockets
+
+    HAS_WEBSOCKETS: bool = True
+except ImportError:  # pragma: no cover
+    HAS_WEBSOCKETS = False
+
+
+class UniFiEvents:
+    """Receive device changes from the UniFi controller events websocket."""
+
+    LISTEN_RUNNING: bool = True
+    RECONNECT_INTERVAL: int = 10
+
+    DEVICE_MESSAGES: Final[Tuple[str, ...]] = ("device:sync", "device:update")
+
+    def __init__(self, unifi_devices, on_changed: Optional[Callable[[], None]] = None, site: str = DEFAULT_SITE):
+        self.config: Config = unifi_devices.config
+        self.site: str = site
+        self.unifi_devices = unifi_devices
+        self.unifi_api = unifi_devices.unifi_api
+        self.on_changed: Optional[Callable[[], None]] = on_changed
+
+        self.url: str = self.unifi_api.events_url(site)
+        self.connected: bool = False
+        # Login generation of the session the websocket connected with.
+        self._generation: int = 0
+
+    @property
+    def _ssl(self) -> Optional[ssl.SSLContext]:
+        if not self.url.startswith("wss"):
+            return None
+
+        # Same as the REST API: the controller uses a self-signed certificate.
+        context: ssl.SSLContext = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+        return context
+
+    def _on_message(self, message: str):
+        try:
+            data: dict = json.loads(message)
+        except JSONDecodeError:
+            logger.debug("%s Invalid websocket message: %s", LogPrefix.API, message)
+            return
+
+        if data.get("meta", {}).get("message") in self.DEVICE_MESSAGES:
+            changed: set = self.unifi_devices.unifi_device_map.update_ports(data.get("data", []))
+
+            if changed and self.on_changed:
+                self.on_changed()
+
+    async def _listen(self):
+        self._generation = self.unifi_api.login_generation
+        headers: Dict[str, str] = {"Cookie": self.unifi_api.cookies}
+
+        async with websockets.connect(self.url, ssl=self._ssl, extra_headers=headers) as websocket:
+            self.connected = True
+            logger.info("%s Connected to events websocket of site '%s'.", LogPrefix.API, self.site)
+
+            async for message in websocket:
+                self._on_message(message)
+
+    async def listen(self):
+        if not HAS_WEBSOCKETS:
+            logger.error("%s Package 'websockets' is not installed. Fall back to polling.", LogPrefix.API)
+            return
+
+        while self.LISTEN_RUNNING:
+            try:
+                await self._listen()
+            except websockets.InvalidStatusCode as e:
+                logger.error("%s Events websocket rejected: %s", LogPrefix.API, e)
+
+                # The websockets of all sites share one login.
+                if e.status_code == 401:
+                    await self.unifi_api.async_reauthenticate(self._generation)
+            except (OSError, websockets.WebSocketException) as e:
+                logger.error("%s Events websocket disconnected: %s", LogPrefix.API, e)
+            finally:
+                self.connected = False
+
+            await asyncio.sleep(self.RECONNECT_INTERVAL)
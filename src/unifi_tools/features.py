@@ -2,22 +2,22 @@ import json
 from abc import ABC
 from abc import abstractmethod
 from collections.abc import Iterator
+from typing import Any
+from typing import Dict
 from typing import Final
+from typing import Iterable
 from typing import List
+from typing import NamedTuple
 from typing import Optional
+from typing import Tuple
 
 import itertools
+import sys
 
 from superbox_utils.dict.data_dict import DataDict
 from unifi_tools.config import Config
 from unifi_tools.config import FeatureConfig
-
-
-class FeaturePoEState:
-    ON: str = "on"
-    OFF: str = "off"
-    POE: str = "auto"
-    POE24V: str = "pasv24"
+from unifi_tools.config import FeaturePoEState
 
 
 class FeatureConst:
@@ -34,16 +34,35 @@ class FeatureConst:
     )
 
 
+class FeatureState(NamedTuple):
+    # Cheap comparable representation of the state, e.g. the PoE mode.
+    fingerprint: Any
+    json_attributes: str
+    payload: bytes
+
+
+# Shared by all features until their first change.
+EMPTY_FEATURE_STATE: Final[FeatureState] = FeatureState(fingerprint=None, json_attributes="{}", payload=b"{}")
+
+
 class Feature(ABC):
+    __slots__ = ("unifi_devices", "unifi_device", "_state")
+
     name: str = "Feature"
 
     def __init__(self, unifi_devices, unifi_device):
-        self.config: Config = unifi_devices.config
         self.unifi_devices = unifi_devices
         self.unifi_device = unifi_device
-        self.unifi_api = unifi_devices.unifi_api
 
-        self._value: dict = {}
+        self._state: FeatureState = EMPTY_FEATURE_STATE
+
+    @property
+    def config(self) -> Config:
+        return self.unifi_devices.config
+
+    @property
+    def unifi_api(self):
+        return self.unifi_devices.unifi_api
 
     def __repr__(self) -> str:
         return self.friendly_name
@@ -63,6 +82,11 @@ class Feature(ABC):
     def friendly_name(self) -> str:
         pass
 
+    @property
+    @abstractmethod
+    def key(self) -> Tuple[str, int]:
+        pass
+
     @property
     @abstractmethod
     def device_id(self) -> str:
@@ -83,17 +107,51 @@ class Feature(ABC):
     def json_attributes(self) -> str:
         pass
 
+    @property
+    @abstractmethod
+    def fingerprint(self) -> Any:
+        pass
+
+    @abstractmethod
+    async def set_state(self, value: dict) -> bool:
+        pass
+
+    @property
+    def state(self) -> FeatureState:
+        """Return the state from the last ``changed`` check."""
+        return self._state
+
+    def seed_state(self, payload: bytes) -> bool:
+        """Take a retained state payload as already published when it matches the current state."""
+        json_attributes: str = self.json_attributes
+
+        if payload != json_attributes.encode():
+            return False
+
+        self._state = FeatureState(fingerprint=self.fingerprint, json_attributes=json_attributes, payload=payload)
+
+        return True
+
     @property
     def changed(self) -> bool:
-        changed: bool = self.value != self._value
+        fingerprint: Any = self.fingerprint
+
+        if fingerprint == self._state.fingerprint:
+            return False
 
-        if changed:
-            self._value = self.value
+        # Serialize only once per change, the payload is used for publishing and logging.
+        json_attributes: str = self.json_attributes
+        self._state = FeatureState(
+            fingerprint=fingerprint, json_attributes=json_attributes, payload=json_attributes.encode()
+        )
 
-        return changed
+        return True
 
 
 class FeaturePort(Feature):
+    # The identity fields are read for every port on every poll, so they are computed once.
+    __slots__ = ("_store", "_row", "_key", "_device_id", "_unique_id", "_object_id", "_topic")
+
     name: str = "Port"
 
     def __init__(self, unifi_devices, unifi_device, port_info):
@@ -101,14 +159,40 @@ class FeaturePort(Feature):
             unifi_devices=unifi_devices,
             unifi_device=unifi_device,
         )
-        self.port_info = port_info
+        # A thin view over a row of the columnar port store of the device map.
+        ports = unifi_devices.unifi_device_map[unifi_device.id]["ports"]
+        self._store = ports.store
+        self._row: int = ports.row(port_info.idx)
+
+        self.update_identity()
 
     @property
-    def real_poe_mode(self) -> str:
-        device_info = self.unifi_devices.unifi_device_map.get(self.unifi_device.id)
-        port = device_info["ports"][self.port_info.idx]
+    def port_info(self):
+        return self._store.port(self._row)
+
+    def update_identity(self):
+        """Compute the key, IDs and topic from the device and the config, e.g. after a config reload."""
+        features_config: Optional[FeatureConfig] = self.config.features.get(self.unifi_device.id)
+        device_name: str = self.config.device_info.name.lower()
+        feature_name: str = self.feature_name.lower()
+        port_idx: int = self._store.port_idx[self._row]
+
+        self._key: Tuple[str, int] = (self.unifi_device.id, port_idx)
+        device_id: str = (features_config.id if features_config else self.unifi_device.id).lower()
 
-        return port.poe_mode
+        # Keep the topics of multiple sites apart.
+        if self.config.unifi_controller.site_topics:
+            device_id = f"{self.unifi_device.info.get('site', 'default')}-{device_id}"
+
+        # All ports of a device share the same device_id string.
+        self._device_id: str = sys.intern(device_id)
+        self._unique_id: str = f"{device_name}-{self.unifi_device.id.lower()}-{feature_name}-{port_idx}"
+        self._object_id: str = f"{device_name}-{self._device_id}-{feature_name}-{port_idx}"
+        self._topic: str = f"{device_name}/{self._device_id}-{feature_name}-{port_idx}"
+
+    @property
+    def real_poe_mode(self) -> str:
+        return self._store.poe_modes[self._store.poe_mode_code[self._row]]
 
     @property
     def poe_mode(self) -> str:
@@ -122,9 +206,10 @@ class FeaturePort(Feature):
     @property
     def value(self) -> dict:
         _value: dict = {}
+        poe_mode: str = self.poe_mode
 
-        if self.poe_mode:
-            _value[FeatureConst.POE_MODE] = self.poe_mode
+        if poe_mode:
+            _value[FeatureConst.POE_MODE] = poe_mode
 
         return _value
 
@@ -134,100 +219,84 @@ class FeaturePort(Feature):
 
     @property
     def friendly_name(self) -> str:
-        if self.port_info.name:
-            return self.port_info.name
+        name: str = self._store.name(self._row)
 
-        return f"{self.name} #{self.port_info.idx:02d}"
+        if name:
+            return name
 
-    @property
-    def device_id(self) -> str:
-        _device_id: str = self.unifi_device.id
-        features_config: Optional[FeatureConfig] = self.config.features.get(self.unifi_device.id)
+        return f"{self.name} #{self._store.port_idx[self._row]:02d}"
 
-        if features_config:
-            _device_id = features_config.id
+    @property
+    def key(self) -> Tuple[str, int]:
+        return self._key
 
-        return _device_id.lower()
+    @property
+    def device_id(self) -> str:
+        return self._device_id
 
     @property
     def unique_id(self) -> str:
-        return f"{self.config.device_info.name.lower()}-{self.unifi_device.id.lower()}-{self.feature_name.lower()}-{self.port_info.idx}"
+        return self._unique_id
 
     @property
     def object_id(self) -> str:
-        return (
-            f"{self.config.device_info.name.lower()}-{self.device_id}-{self.feature_name.lower()}-{self.port_info.idx}"
-        )
+        return self._object_id
 
     @property
     def topic(self) -> str:
-        return (
-            f"{self.config.device_info.name.lower()}/{self.device_id}-{self.feature_name.lower()}-{self.port_info.idx}"
-        )
+        return self._topic
 
     @property
     def json_attributes(self) -> str:
         _json_attributes: dict = {}
+        real_poe_mode: str = self.real_poe_mode
 
-        if self.real_poe_mode:
-            _json_attributes["poe_mode"] = self.real_poe_mode
+        if real_poe_mode:
+            _json_attributes["poe_mode"] = real_poe_mode
 
         return json.dumps(_json_attributes)
 
+    @property
+    def fingerprint(self) -> Optional[str]:
+        # The published attributes only depend on the PoE mode.
+        return self.real_poe_mode
+
     def _get_real_poe_mode(self, poe_mode: str) -> str:
         # When state is "on" then check settings if PoE for this port is "auto" or "pasv24".
         if poe_mode == FeaturePoEState.ON:
-            features_config: Optional[FeatureConfig] = self.config.features.get(self.unifi_device.id)
-            poe_mode = FeaturePoEState.POE
-
-            if features_config:
-                for port in features_config.ports:
-                    if port.get(FeatureConst.PORT_IDX) == self.port_info.idx:
-                        poe_mode = port.get(FeatureConst.POE_MODE, FeaturePoEState.POE)
-                        break
+            poe_mode = self.config.port_poe_modes.get(self._key, FeaturePoEState.POE)
 
         return poe_mode
 
-    def _set_port_poe(self, port_info: dict, poe_mode: str) -> bool:
-        poe_mode = self._get_real_poe_mode(poe_mode=poe_mode)
-
-        # Only update port if PoE mode is allowed and has changed!
-        if (
-            port_info.get(FeatureConst.POE_MODE)
-            and poe_mode in FeatureConst.POE_MODES
-            and port_info[FeatureConst.POE_MODE] != poe_mode
-        ):
-            port_info[FeatureConst.POE_MODE] = poe_mode
-            return True
-
-        return False
-
-    def set_state(self, value: dict) -> bool:
+    async def set_state(self, value: dict) -> bool:
         update_devices: bool = False
 
         if FeatureConst.POE_MODE in value.keys():
-            device_info = self.unifi_devices.get_device_info(device_id=self.unifi_device.id)
-            port_overrides: list = device_info.get("port_overrides", [])
-
-            for port in port_overrides:
-                if port[FeatureConst.PORT_IDX] == self.port_info.idx:
-                    update_devices = self._set_port_poe(port, value[FeatureConst.POE_MODE])
-                    break
-
-            if update_devices:
-                self.unifi_api.update_device(
-                    device_id=self.unifi_device.id, port_overrides={"port_overrides": port_overrides}
-                )
+            update_devices = await self.unifi_devices.update_port(
+                device_id=self.unifi_device.id,
+                port_idx=self.port_info.idx,
+                poe_mode=self._get_real_poe_mode(poe_mode=value[FeatureConst.POE_MODE]),
+            )
 
         return update_devices
 
 
 class FeatureMap(DataDict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._keys: Dict[Tuple[str, int], List[Feature]] = {}
+
     def register(self, feature: Feature):
         if not self.get(feature.feature_name):
             self[feature.feature_name] = []
 
         self[feature.feature_name].append(feature)
+        self._keys.setdefault(feature.key, []).append(feature)
 
     def by_feature_type(self, feature_type: List[str]) -> Iterator:
         return itertools.chain.from_iterable(filter(None, map(self.data.get, feature_type)))
+
+    def by_keys(self, feature_type: List[str], keys: Iterable[Tuple[str, int]]) -> Iterator:
+        features: Iterator = itertools.chain.from_iterable(filter(None, map(self._keys.get, keys)))
+        return (feature for feature in features if feature.feature_name in feature_type)
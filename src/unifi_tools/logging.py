@@ -4,4 +4,5 @@ LOG_NAME: Final[str] = "unifi-tools"
 LOG_MQTT_PUBLISH: Final[str] = "[MQTT] [%s] Publishing message: %s"
 LOG_MQTT_SUBSCRIBE: Final[str] = "[MQTT] [%s] Subscribe message: %s"
 LOG_MQTT_INVALID_SUBSCRIBE: Final[str] = "[MQTT] [%s] Invalid subscribe message: %s"
+LOG_MQTT_SUBSCRIBE_FAILED: Final[str] = "[MQTT] [%s] Subscribe message failed: %s"
 LOG_MQTT_SUBSCRIBE_TOPIC: Final[str] = "[MQTT] Subscribe topic %s"
@@ -1,5 +1,7 @@
 import asyncio
 import json
+import time
+from functools import partial
 from abc import ABC
 from abc import abstractmethod
 from asyncio import Task
@@ -7,16 +9,26 @@ from contextlib import AsyncExitStack
 from typing import Any
 from typing import AsyncContextManager
 from typing import AsyncIterable
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Sequence
 from typing import Set
+from typing import Tuple
 
+from unifi_tools.config import LogPrefix
 from unifi_tools.config import logger
+from unifi_tools.events import UniFiEvents
+from unifi_tools.features import Feature
 from unifi_tools.features import FeatureConst
 from unifi_tools.features import FeatureMap
 from unifi_tools.logging import LOG_MQTT_INVALID_SUBSCRIBE
 from unifi_tools.logging import LOG_MQTT_PUBLISH
 from unifi_tools.logging import LOG_MQTT_SUBSCRIBE
+from unifi_tools.logging import LOG_MQTT_SUBSCRIBE_FAILED
 from unifi_tools.logging import LOG_MQTT_SUBSCRIBE_TOPIC
+from unifi_tools.plugins.retained import read_retained
+from unifi_tools.scheduler import PollScheduler
 
 
 class BaseFeaturesMqttPlugin(ABC):
@@ -28,28 +40,96 @@ class BaseFeaturesMqttPlugin(ABC):
         self.mqtt_client = mqtt_client
         self.features: FeatureMap = unifi_devices.features
 
-    async def init_tasks(self, stack: AsyncExitStack) -> Set[Task]:
+        # Command topic to feature, built once when the tasks are initialised.
+        self.topics: Dict[str, Feature] = {}
+
+    @property
+    def subscribe_topic(self) -> str:
+        return f"{self.unifi_devices.config.device_info.name.lower()}/+/set"
+
+    async def init_tasks(self, stack: AsyncExitStack, subscribe: bool = True) -> Set[Task]:
+        """Start the publish task and, unless the caller subscribes for several plugins, the subscribe task."""
+        tasks: Set[Task] = set()
+
+        if subscribe:
+            tasks.update(await self.init_subscribe_tasks(stack, self.mqtt_client, [self]))
+
+        task = asyncio.create_task(self._publish())
+        tasks.add(task)
+
+        return tasks
+
+    @staticmethod
+    async def init_subscribe_tasks(
+        stack: AsyncExitStack, mqtt_client, plugins: Sequence["BaseFeaturesMqttPlugin"]
+    ) -> Set[Task]:
+        """Subscribe once to the command topics of all plugins, e.g. one plugin per UniFi controller.
+
+        The MQTT client keeps only one message callback per topic filter. A second subscription
+        to the same filter would replace the first one and drop the commands of its plugin.
+        """
         tasks: Set[Task] = set()
+        plugins_by_topic: Dict[str, BaseFeaturesMqttPlugin] = {}
 
-        for feature in self.features.by_feature_type(self.subscribe_feature_types):
-            topic: str = f"{feature.topic}/set"
+        for plugin in plugins:
+            plugin.topics = {
+                f"{feature.topic}/set": feature
+                for feature in plugin.features.by_feature_type(plugin.subscribe_feature_types)
+            }
+            plugins_by_topic.update(dict.fromkeys(plugin.topics, plugin))
 
-            manager: AsyncContextManager = self.mqtt_client.filtered_messages(topic)
+        # One wildcard subscription for all features instead of one per feature.
+        for topic in sorted({plugin.subscribe_topic for plugin in plugins}):
+            manager: AsyncContextManager = mqtt_client.filtered_messages(topic)
             messages: AsyncIterable = await stack.enter_async_context(manager)
 
-            subscribe_task: Task[Any] = asyncio.create_task(self._subscribe(feature, topic, messages))
+            subscribe_task: Task[Any] = asyncio.create_task(
+                BaseFeaturesMqttPlugin._subscribe(messages, plugins_by_topic)
+            )
             tasks.add(subscribe_task)
 
-            await self.mqtt_client.subscribe(topic)
+            await mqtt_client.subscribe(topic)
             logger.debug(LOG_MQTT_SUBSCRIBE_TOPIC, topic)
 
-        task = asyncio.create_task(self._publish())
-        tasks.add(task)
-
         return tasks
 
+    @staticmethod
+    async def _subscribe(messages: AsyncIterable, plugins_by_topic: Dict[str, "BaseFeaturesMqttPlugin"]):
+        # Commands run as separate tasks, so commands for the same switch can be coalesced.
+        commands: Set[Task] = set()
+
+        async for message in messages:
+            topic: str = message.topic
+            plugin: Optional[BaseFeaturesMqttPlugin] = plugins_by_topic.get(topic)
+
+            if plugin is None:
+                continue
+
+            command: Task[Any] = asyncio.create_task(
+                plugin._set_state(plugin.topics[topic], topic, message.payload.decode())
+            )
+            commands.add(command)
+            command.add_done_callback(partial(BaseFeaturesMqttPlugin._command_done, commands, topic))
+
+        if commands:
+            # The done callbacks log the failed commands.
+            await asyncio.gather(*commands, return_exceptions=True)
+
+    @staticmethod
+    def _command_done(commands: Set[Task], topic: str, command: Task):
+        commands.discard(command)
+
+        # Read the result, otherwise a failed command is only reported when the task is garbage collected.
+        if command.cancelled():
+            return
+
+        exception: Optional[BaseException] = command.exception()
+
+        if exception:
+            logger.error(LOG_MQTT_SUBSCRIBE_FAILED, topic, exception, exc_info=exception)
+
     @abstractmethod
-    async def _subscribe(self, feature, topic: str, messages: AsyncIterable):
+    async def _set_state(self, feature: Feature, topic: str, value: str):
         pass
 
     @abstractmethod
@@ -68,29 +148,132 @@ class FeaturesMqttPlugin(BaseFeaturesMqttPlugin):
     def __init__(self, unifi_devices, mqtt_client):
         super().__init__(unifi_devices, mqtt_client)
 
-    async def _subscribe(self, feature, topic: str, messages: AsyncIterable):
-        async for message in messages:
-            data: dict = {}
+        self.scheduler: PollScheduler = PollScheduler(
+            min_interval=unifi_devices.config.unifi_controller.poll_min_interval,
+            max_interval=unifi_devices.config.unifi_controller.poll_max_interval,
+        )
+
+        # One events websocket per site.
+        self.events: List[UniFiEvents] = []
+        self._last_scan: float = 0
+
+        if unifi_devices.config.unifi_controller.websocket:
+            self.events = [
+                UniFiEvents(unifi_devices, on_changed=self.scheduler.trigger, site=site) for site in unifi_devices.sites
+            ]
 
-            value: str = message.payload.decode()
+        # Features by aggregated device state topic and the last published device states.
+        self.devices: Dict[str, List[Feature]] = {}
+        self._device_states: Dict[str, str] = {}
 
-            try:
-                data = json.loads(value)
-            except ValueError:
-                logger.error(LOG_MQTT_INVALID_SUBSCRIBE, topic, value)
+    async def init_tasks(self, stack: AsyncExitStack, subscribe: bool = True) -> Set[Task]:
+        if self.unifi_devices.config.unifi_controller.device_state:
+            self.devices = self._get_devices()
 
-            if data:
-                feature.set_state(data)
-                logger.info(LOG_MQTT_SUBSCRIBE, topic, value)
+        tasks: Set[Task] = await super().init_tasks(stack, subscribe=subscribe)
+
+        for events in self.events:
+            tasks.add(asyncio.create_task(events.listen()))
+
+        return tasks
+
+    @property
+    def _scan_due(self) -> bool:
+        # With a connected events websocket the device map is updated by the controller.
+        # A slow poll still reconciles missed events.
+        if self.events and all(events.connected for events in self.events):
+            return time.monotonic() - self._last_scan >= self.unifi_devices.config.unifi_controller.reconcile_interval
+
+        return True
+
+    async def _set_state(self, feature: Feature, topic: str, value: str):
+        data: dict = {}
+
+        try:
+            data = json.loads(value)
+        except ValueError:
+            logger.error(LOG_MQTT_INVALID_SUBSCRIBE, topic, value)
+
+        if data:
+            await feature.set_state(data)
+            logger.info(LOG_MQTT_SUBSCRIBE, topic, value)
+
+            # Pick up the new state with the next poll.
+            self.scheduler.trigger()
+
+    async def _seed_states(self):
+        """Seed the published states from the retained state topics, so unchanged states are not sent again."""
+        topic: str = f"{self.unifi_devices.config.device_info.name.lower()}/+/get"
+        retained: Dict[str, bytes] = await read_retained(self.mqtt_client, topic)
+
+        if not retained:
+            return
+
+        seeded: int = 0
+
+        for feature in self.features.by_feature_type(self.publish_feature_types):
+            payload: Optional[bytes] = retained.get(f"{feature.topic}/get")
+
+            if payload is not None and feature.seed_state(payload):
+                seeded += 1
+
+        logger.debug("%s Seeded %s unchanged states from retained messages.", LogPrefix.MQTT, seeded)
+
+    def _get_devices(self) -> Dict[str, List[Feature]]:
+        devices: Dict[str, List[Feature]] = {}
+
+        for feature in self.features.by_feature_type(self.publish_feature_types):
+            topic: str = f"{self.unifi_devices.config.device_info.name.lower()}/{feature.device_id}/state"
+            devices.setdefault(topic, []).append(feature)
+
+        return devices
+
+    async def _publish_devices(self, changed_devices: Set[str]):
+        for topic, features in self.devices.items():
+            # Every device state is published once, afterwards only when a port of the device changed.
+            if topic in self._device_states and features[0].device_id not in changed_devices:
+                continue
+
+            # The port states are already JSON, so the document is joined instead of serialized again.
+            json_attributes: str = (
+                "{"
+                + ", ".join(
+                    f'"{feature.feature_name}-{feature.key[1]}": {feature.json_attributes}' for feature in features
+                )
+                + "}"
+            )
+
+            if self._device_states.get(topic) == json_attributes:
+                continue
+
+            await self.mqtt_client.publish(topic, json_attributes.encode(), qos=1, retain=True)
+            self._device_states[topic] = json_attributes
+            logger.info(LOG_MQTT_PUBLISH, topic, json_attributes)
 
     async def _publish(self):
+        await self._seed_states()
+
         while self.PUBLISH_RUNNING:
-            self.unifi_devices.scan()
+            await self.scheduler.wait()
+            self.scheduler.start()
+
+            if self._scan_due:
+                self._last_scan = time.monotonic()
+                await self.unifi_devices.scan()
 
-            for feature in self.features.by_feature_type(self.publish_feature_types):
+            # Only visit features of ports that changed since the last pass (scan or websocket event).
+            changed: Set[Tuple[str, int]] = self.unifi_devices.unifi_device_map.pop_changed()
+
+            changed_devices: Set[str] = set()
+
+            for feature in self.features.by_keys(self.publish_feature_types, changed):
                 if feature.changed:
                     topic: str = f"{feature.topic}/get"
-                    await self.mqtt_client.publish(topic, feature.json_attributes, qos=1, retain=True)
-                    logger.info(LOG_MQTT_PUBLISH, topic, feature.json_attributes)
+                    await self.mqtt_client.publish(topic, feature.state.payload, qos=1, retain=True)
+                    logger.info(LOG_MQTT_PUBLISH, topic, feature.state.json_attributes)
+                    changed_devices.add(feature.device_id)
+
+            if self.devices:
+                await self._publish_devices(changed_devices)
 
-            await asyncio.sleep(25e-3)
+            self.scheduler.finish(changed=bool(changed))
@@ -2,22 +2,22 @@ import asyncio
 import json
 from asyncio import Task
 from typing import Any
+from typing import Iterator
 from typing import List
 from typing import Set
 from typing import Tuple
 
 from unifi_tools.config import Config
-from unifi_tools.config import logger
 from unifi_tools.features import FeatureConst
 from unifi_tools.features import FeatureMap
 from unifi_tools.features import FeaturePoEState
-from unifi_tools.logging import LOG_MQTT_PUBLISH
 from unifi_tools.plugins.hass.discover import HassBaseDiscovery
 from unifi_tools.unifi import UniFiDevices
 
 
 class HassBinarySensorsDiscovery(HassBaseDiscovery):
     publish_feature_types: List[str] = [FeatureConst.PORT]
+    component: str = "binary_sensor"
 
     def __init__(self, unifi_devices: UniFiDevices, mqtt_client):
         self.config: Config = unifi_devices.config
@@ -27,8 +27,7 @@ class HassBinarySensorsDiscovery(HassBaseDiscovery):
 
         super().__init__(config=unifi_devices.config)
 
-    def _get_discovery(self, feature) -> Tuple[str, dict]:
-        topic: str = f"{self.config.homeassistant.discovery_prefix}/binary_sensor/{feature.topic}/config"
+    def _get_component(self, feature) -> dict:
         poe_on_states: str = "'" + FeaturePoEState.POE + "', '" + FeaturePoEState.POE24V + "'"
 
         message: dict = {
@@ -40,26 +39,30 @@ class HassBinarySensorsDiscovery(HassBaseDiscovery):
             "value_template": "{% if value_json.poe_mode in [" + poe_on_states + "] %}on{% else %}off{% endif %}",
             "payload_on": "on",
             "payload_off": "off",
+        }
+
+        return message
+
+    def _get_discovery(self, feature) -> Tuple[str, dict]:
+        topic: str = f"{self.config.homeassistant.discovery_prefix}/{self.component}/{feature.topic}/config"
+
+        message: dict = {
+            **self._get_component(feature),
             "qos": 2,
-            "device": {
-                "name": feature.unifi_device.info["name"],
-                "identifiers": feature.unifi_device.id,
-                "model": feature.unifi_device.info["model"],
-                "sw_version": feature.unifi_device.info["version"],
-                "manufacturer": self.config.device_info.manufacturer,
-            },
+            "device": self._get_device(feature.unifi_device),
         }
 
         return topic, message
 
-    async def publish(self):
+    def _get_messages(self) -> Iterator[Tuple[str, str]]:
         for feature in self.features.by_feature_type(self.publish_feature_types):
             # TODO Refactor when multiple feature types exists!
             if feature.poe_mode:
                 topic, message = self._get_discovery(feature)
-                json_data: str = json.dumps(message)
-                await self.mqtt_client.publish(topic, json_data, qos=2, retain=True)
-                logger.debug(LOG_MQTT_PUBLISH, topic, json_data)
+                yield topic, json.dumps(message)
+
+    async def publish(self):
+        await self._publish_messages(self.mqtt_client, self._get_messages())
 
 
 class HassBinarySensorsMqttPlugin:
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from asyncio import Task
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from unifi_tools.config import Config
+from unifi_tools.config import LogPrefix
+from unifi_tools.config import logger
+from unifi_tools.features import FeatureConst
+from unifi_tools.features import FeatureMap
+from unifi_tools.features import FeaturePort
+from unifi_tools.plugins.hass.binary_sensors import HassBinarySensorsDiscovery
+from unifi_tools.plugins.hass.discover import HassBaseDiscovery
+from unifi_tools.plugins.hass.switches import HassSwitchesDiscovery
+from unifi_tools.unifi import UniFiDevices
+from unifi_tools.version import __version__
+
+
+class HassDevicesDiscovery(HassBaseDiscovery):
+    """Publish one discovery config per UniFi device with the components of all its ports."""
+
+    publish_feature_types: List[str] = [FeatureConst.PORT]
+    component: str = "device"
+
+    def __init__(self, unifi_devices: UniFiDevices, mqtt_client):
+        self.config: Config = unifi_devices.config
+        self.unifi_devices: UniFiDevices = unifi_devices
+        self.mqtt_client = mqtt_client
+        self.features: FeatureMap = unifi_devices.features
+
+        # The per port discoveries provide the components.
+        self.discoveries: List[Union[HassSwitchesDiscovery, HassBinarySensorsDiscovery]] = [
+            HassSwitchesDiscovery(unifi_devices, mqtt_client),
+            HassBinarySensorsDiscovery(unifi_devices, mqtt_client),
+        ]
+
+        super().__init__(config=unifi_devices.config)
+
+    def _get_discovery(self, features: List[FeaturePort]) -> Tuple[str, dict]:
+        unifi_device = features[0].unifi_device
+        device_name: str = self.config.device_info.name.lower()
+        topic: str = f"{self.config.homeassistant.discovery_prefix}/{self.component}/{device_name}/{features[0].device_id}/config"
+
+        components: Dict[str, dict] = {}
+
+        for feature in features:
+            for discovery in self.discoveries:
+                components[f"{feature.object_id}-{discovery.component}"] = {
+                    "platform": discovery.component,
+                    **discovery._get_component(feature),
+                }
+
+        message: dict = {
+            "device": self._get_device(unifi_device),
+            "origin": {"name": "UniFi Tools", "sw_version": __version__},
+            "components": components,
+            "qos": 2,
+        }
+
+        return topic, message
+
+    def _get_messages(self) -> Iterator[Tuple[str, str]]:
+        devices: Dict[str, List[FeaturePort]] = {}
+
+        for feature in self.features.by_feature_type(self.publish_feature_types):
+            if feature.poe_mode:
+                devices.setdefault(feature.unifi_device.id, []).append(feature)
+
+        for features in devices.values():
+            topic, message = self._get_discovery(features)
+            yield topic, json.dumps(message)
+
+    async def _remove_port_configs(self):
+        # Remove the retained per port configs, otherwise Home Assistant shows every port twice.
+        for discovery in self.discoveries:
+            hashes: Dict[str, str] = await discovery._read_hashes(self.mqtt_client)
+            count: int = len(hashes)
+
+            # An empty retained message clears the config, with the same publish window as the discovery.
+            await discovery._publish_messages(self.mqtt_client, [(topic, b"") for topic in hashes])
+
+            if count:
+                logger.info("%s Removed %s retained %s discovery configs.", LogPrefix.MQTT, count, discovery.component)
+
+            hashes.clear()
+
+    async def publish(self):
+        await self._remove_port_configs()
+        await self._publish_messages(self.mqtt_client, self._get_messages())
+
+
+class HassDevicesMqttPlugin:
+    """Provide Home Assistant MQTT device discovery for switches and binary sensors."""
+
+    def __init__(self, unifi_devices: UniFiDevices, mqtt_client):
+        self._hass = HassDevicesDiscovery(unifi_devices, mqtt_client)
+
+    async def init_tasks(self) -> Set[Task]:
+        tasks: Set[Task] = set()
+
+        task: Task[Any] = asyncio.create_task(self._hass.publish())
+        tasks.add(task)
+
+        return tasks
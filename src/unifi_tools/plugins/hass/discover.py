@@ -1,13 +1,52 @@
+import asyncio
+import hashlib
+import time
 from abc import ABC
 from abc import abstractmethod
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
 from typing import Tuple
+from typing import Union
 
 from unifi_tools.config import Config
+from unifi_tools.config import LogPrefix
+from unifi_tools.config import logger
+from unifi_tools.logging import LOG_MQTT_PUBLISH
+from unifi_tools.plugins.retained import read_retained
 
 
 class HassBaseDiscovery(ABC):
+    # Home Assistant component of the discovery topic, e.g. "switch".
+    component: str = ""
+
     def __init__(self, config: Config):
         self.config: Config = config
+        # Seconds the last discovery took.
+        self.duration: float = 0
+        # Content hash of the discovery config the broker holds, by topic.
+        self._hashes: Optional[Dict[str, str]] = None
+
+    @property
+    def discovery_topic(self) -> str:
+        return f"{self.config.homeassistant.discovery_prefix}/{self.component}/{self.config.device_info.name.lower()}/+/config"
+
+    @staticmethod
+    def _hash(payload: Union[str, bytes]) -> str:
+        if isinstance(payload, str):
+            payload = payload.encode()
+
+        return hashlib.sha256(payload).hexdigest()
+
+    def _get_device(self, unifi_device) -> dict:
+        return {
+            "name": unifi_device.info["name"],
+            "identifiers": unifi_device.id,
+            "model": unifi_device.info["model"],
+            "sw_version": unifi_device.info["version"],
+            "manufacturer": self.config.device_info.manufacturer,
+        }
 
     @abstractmethod
     def _get_discovery(self, feature) -> Tuple[str, dict]:
@@ -16,3 +55,47 @@ class HassBaseDiscovery(ABC):
     @abstractmethod
     async def publish(self):
         pass
+
+    async def _read_hashes(self, mqtt_client) -> Dict[str, str]:
+        if self._hashes is None:
+            retained: Dict[str, bytes] = await read_retained(mqtt_client, self.discovery_topic)
+            self._hashes = {topic: self._hash(payload) for topic, payload in retained.items()}
+
+        return self._hashes
+
+    async def _publish_messages(self, mqtt_client, messages: Iterable[Tuple[str, Union[str, bytes]]]):
+        """Publish changed discovery messages with up to ``discovery_window`` publishes in flight."""
+        started: float = time.monotonic()
+        qos: int = self.config.homeassistant.discovery_qos
+        hashes: Dict[str, str] = await self._read_hashes(mqtt_client)
+        pending: Iterator[Tuple[str, Union[str, bytes]]] = iter(messages)
+        count: int = 0
+        unchanged: int = 0
+
+        async def worker():
+            nonlocal count, unchanged
+
+            # All workers take the next message from the same iterator.
+            for topic, json_data in pending:
+                digest: str = self._hash(json_data)
+
+                # The broker already holds this config as retained message.
+                if hashes.get(topic) == digest:
+                    unchanged += 1
+                    continue
+
+                await mqtt_client.publish(topic, json_data, qos=qos, retain=True)
+                hashes[topic] = digest
+                logger.debug(LOG_MQTT_PUBLISH, topic, json_data)
+                count += 1
+
+        await asyncio.gather(*(worker() for _ in range(self.config.homeassistant.discovery_window)))
+
+        self.duration = time.monotonic() - started
+        logger.debug(
+            "%s Published %s discovery messages in %.3fs (%s unchanged).",
+            LogPrefix.MQTT,
+            count,
+            self.duration,
+            unchanged,
+        )
@@ -0,0 +1,62 @@
+import asyncio
+from typing import AsyncContextManager
+from typing import AsyncIterator
+from typing import Dict
+from typing import Final
+from typing import Optional
+from typing import Tuple
+
+from unifi_tools.config import LogPrefix
+from unifi_tools.config import logger
+
+# The broker sends the retained messages right after the subscription.
+# Stop reading when no message arrived for this many seconds.
+RETAINED_TIMEOUT: Final[float] = 0.5
+
+
+# Reads in progress by MQTT client and topic filter.
+_reads: Dict[Tuple[int, str], "asyncio.Future[Dict[str, bytes]]"] = {}
+
+
+async def _read_retained(mqtt_client, topic: str, timeout: float) -> Dict[str, bytes]:
+    retained: Dict[str, bytes] = {}
+
+    manager: AsyncContextManager = mqtt_client.filtered_messages(topic)
+
+    async with manager as messages:
+        await mqtt_client.subscribe(topic)
+        iterator: AsyncIterator = messages.__aiter__()
+
+        while True:
+            try:
+                message = await asyncio.wait_for(iterator.__anext__(), timeout=timeout)
+            except (asyncio.TimeoutError, StopAsyncIteration):
+                break
+
+            # An empty retained payload means the topic was cleared.
+            if getattr(message, "retain", True) and message.payload:
+                retained[message.topic] = message.payload
+
+        await mqtt_client.unsubscribe(topic)
+
+    logger.debug("%s Read %s retained messages from %s", LogPrefix.MQTT, len(retained), topic)
+
+    return retained
+
+
+async def read_retained(mqtt_client, topic: str, timeout: float = RETAINED_TIMEOUT) -> Dict[str, bytes]:
+    """Subscribe briefly to a topic and return the retained payloads by topic.
+
+    The MQTT client keeps only one message callback per topic filter, so concurrent reads
+    of the same filter (e.g. one per UniFi controller) share one subscription.
+    """
+    key: Tuple[int, str] = (id(mqtt_client), topic)
+    read: Optional[asyncio.Future] = _reads.get(key)
+
+    if read is None:
+        read = asyncio.ensure_future(_read_retained(mqtt_client, topic, timeout))
+        read.add_done_callback(lambda _: _reads.pop(key, None))
+        _reads[key] = read
+
+    # Every caller gets its own copy, and a cancelled caller does not cancel the shared read.
+    return dict(await asyncio.shield(read))
@@ -9,6 +9,7 @@ from asyncio import Task
 from contextlib import AsyncExitStack
 from pathlib import Path
 from typing import Final
+from typing import List
 from typing import Set
 
 import sys
@@ -25,6 +26,7 @@ from unifi_tools.config import logger
 from unifi_tools.logging import LOG_NAME
 from unifi_tools.plugins.features import FeaturesMqttPlugin
 from unifi_tools.plugins.hass.binary_sensors import HassBinarySensorsMqttPlugin
+from unifi_tools.plugins.hass.devices import HassDevicesMqttPlugin
 from unifi_tools.plugins.hass.switches import HassSwitchesMqttPlugin
 from unifi_tools.unifi import UniFiAPI
 from unifi_tools.unifi import UniFiDevices
@@ -36,32 +38,57 @@ disable_warnings(InsecureRequestWarning)
 class UniFiTools:
     NAME: Final[str] = "unifi-tools"
 
-    def __init__(self, unifi_devices: UniFiDevices):
-        self.unifi_devices: UniFiDevices = unifi_devices
-        self.config: Config = unifi_devices.config
+    def __init__(self, unifi_devices: List[UniFiDevices]):
+        # One UniFiDevices per UniFi controller. All controllers share the MQTT connection.
+        self.unifi_devices: List[UniFiDevices] = unifi_devices
+        self.config: Config = unifi_devices[0].config
 
-    async def _init_tasks(self, stack: AsyncExitStack, mqtt_client: Client):
+    async def _init_controller_tasks(
+        self, stack: AsyncExitStack, mqtt_client: Client, features: FeaturesMqttPlugin
+    ) -> Set[Task]:
         tasks: Set[Task] = set()
+        unifi_devices: UniFiDevices = features.unifi_devices
+
+        # Renew the session in the background instead of on the first request after it expired.
+        tasks.add(asyncio.create_task(unifi_devices.unifi_api.renew_session()))
 
-        features = FeaturesMqttPlugin(unifi_devices=self.unifi_devices, mqtt_client=mqtt_client)
-        features_tasks = await features.init_tasks(stack)
+        features_tasks = await features.init_tasks(stack, subscribe=False)
         tasks.update(features_tasks)
 
-        if self.config.homeassistant.enabled:
+        if self.config.homeassistant.enabled and self.config.homeassistant.device_discovery:
+            hass_devices_plugin = HassDevicesMqttPlugin(unifi_devices=unifi_devices, mqtt_client=mqtt_client)
+            hass_devices_tasks = await hass_devices_plugin.init_tasks()
+            tasks.update(hass_devices_tasks)
+        elif self.config.homeassistant.enabled:
             hass_binary_sensors_plugin = HassBinarySensorsMqttPlugin(
-                unifi_devices=self.unifi_devices, mqtt_client=mqtt_client
+                unifi_devices=unifi_devices, mqtt_client=mqtt_client
             )
             hass_binary_sensors_tasks = await hass_binary_sensors_plugin.init_tasks()
             tasks.update(hass_binary_sensors_tasks)
 
-            hass_switches_plugin = HassSwitchesMqttPlugin(unifi_devices=self.unifi_devices, mqtt_client=mqtt_client)
+            hass_switches_plugin = HassSwitchesMqttPlugin(unifi_devices=unifi_devices, mqtt_client=mqtt_client)
             hass_switches_tasks = await hass_switches_plugin.init_tasks()
             tasks.update(hass_switches_tasks)
 
+        return tasks
+
+    async def _init_tasks(self, stack: AsyncExitStack, mqtt_client: Client):
+        features_plugins: List[FeaturesMqttPlugin] = [
+            FeaturesMqttPlugin(unifi_devices=unifi_devices, mqtt_client=mqtt_client)
+            for unifi_devices in self.unifi_devices
+        ]
+
+        # All controllers share the command topics, so they are subscribed only once.
+        tasks: Set[Task] = await FeaturesMqttPlugin.init_subscribe_tasks(stack, mqtt_client, features_plugins)
+
+        # Every controller polls in its own tasks, so the controllers are scheduled concurrently.
+        for features in features_plugins:
+            tasks.update(await self._init_controller_tasks(stack, mqtt_client, features))
+
         await asyncio.gather(*tasks)
 
     async def run(self):
-        self.unifi_devices.read_devices()
+        await asyncio.gather(*(unifi_devices.read_devices() for unifi_devices in self.unifi_devices))
 
         await mqtt_connect(
             mqtt_config=self.config.mqtt,
@@ -134,11 +161,15 @@ def main():
         else:
             loop = asyncio.new_event_loop()
 
-            unifi_api = UniFiAPI(config=config)
-            unifi_api.login()
+            # Every controller gets its own session and device state.
+            unifi_apis: List[UniFiAPI] = [
+                UniFiAPI(config=controller_config) for controller_config in config.get_controller_configs()
+            ]
+
+            for unifi_api in unifi_apis:
+                unifi_api.start_session()
 
-            unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-            unifi_tools = UniFiTools(unifi_devices=unifi_devices)
+            unifi_tools = UniFiTools(unifi_devices=[UniFiDevices(unifi_api=unifi_api) for unifi_api in unifi_apis])
 
             for sig in (signal.SIGINT, signal.SIGTERM):
                 loop.add_signal_handler(sig, cancel_tasks)
@@ -148,10 +179,20 @@ def main():
             except asyncio.CancelledError:
                 pass
             finally:
-                if unifi_api.rc > 0:
-                    sys.exit(unifi_api.rc)
+                for unifi_api in unifi_apis:
+                    loop.run_until_complete(unifi_api.async_close())
+                    unifi_api.shutdown()
+
+                rc: int = max(unifi_api.rc for unifi_api in unifi_apis)
+
+                if rc > 0:
+                    sys.exit(rc)
                 else:
-                    unifi_api.logout()
+                    for unifi_api in unifi_apis:
+                        # A cached session stays valid for the next start.
+                        if not unifi_api.config.unifi_controller.session_cache:
+                            unifi_api.logout()
+
                     logger.info("Successfully shutdown the UniFi Tools service.")
     except ConfigException as e:
         logger.error(e)
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+
+from unifi_tools.config import LogPrefix
+from unifi_tools.config import logger
+
+
+class PollStats(NamedTuple):
+    # Seconds the last poll took.
+    duration: float
+    # Seconds the last poll started later than scheduled.
+    skew: float
+    # Seconds until the next poll.
+    interval: float
+    # Polls and the longest poll in seconds since the last summary in the log.
+    polls: int
+    max_duration: float
+
+
+class PollScheduler:
+    """Schedule controller polls between a minimum and a maximum interval.
+
+    The interval doubles while polls show no changes and snaps back to the minimum
+    interval after a change or a trigger (e.g. a ``/set`` command). A new poll is
+    only scheduled after the previous poll has finished.
+    """
+
+    BACKOFF: Final[float] = 2.0
+    # Polls that take longer than this many seconds are logged right away.
+    SLOW_POLL: float = 1.0
+    # Seconds between the poll summaries in the log.
+    LOG_INTERVAL: float = 60.0
+
+    def __init__(self, min_interval: float, max_interval: float):
+        self.min_interval: float = min_interval
+        self.max_interval: float = max_interval
+        self.interval: float = min_interval
+        self.stats: PollStats = PollStats(duration=0, skew=0, interval=min_interval, polls=0, max_duration=0)
+
+        self._next_poll: float = time.monotonic()
+        self._logged: float = self._next_poll
+        self._started: float = 0
+        self._in_flight: bool = False
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def in_flight(self) -> bool:
+        return self._in_flight
+
+    def _get_wakeup(self) -> asyncio.Event:
+        # Create the event lazily inside the running event loop.
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+
+        return self._wakeup
+
+    def trigger(self):
+        """Poll as soon as possible and continue with the minimum interval."""
+        self.interval = self.min_interval
+        self._next_poll = time.monotonic()
+        self._get_wakeup().set()
+
+    async def wait(self):
+        wakeup: asyncio.Event = self._get_wakeup()
+        delay: float = self._next_poll - time.monotonic()
+
+        if delay > 0 and not wakeup.is_set():
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        self._started = time.monotonic()
+        self._in_flight = True
+        self.stats = self.stats._replace(skew=max(self._started - self._next_poll, 0))
+        self._get_wakeup().clear()
+
+    def finish(self, changed: bool):
+        finished: float = time.monotonic()
+        self._in_flight = False
+
+        if changed or self._get_wakeup().is_set():
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.BACKOFF, self.max_interval)
+
+        self._next_poll = finished + self.interval
+
+        duration: float = finished - self._started
+        self.stats = self.stats._replace(
+            duration=duration,
+            interval=self.interval,
+            polls=self.stats.polls + 1,
+            max_duration=max(self.stats.max_duration, duration),
+        )
+
+        # A debug line per poll would be up to 40 lines per second at the minimum interval.
+        if duration >= self.SLOW_POLL:
+            logger.warning(
+                "%s Poll took %.3fs (skew %.3fs), next poll in %.3fs.",
+                LogPrefix.API,
+                duration,
+                self.stats.skew,
+                self.interval,
+            )
+
+        if finished - self._logged >= self.LOG_INTERVAL:
+            logger.debug(
+                "%s %s polls in %.0fs, longest poll took %.3fs, next poll in %.3fs.",
+                LogPrefix.API,
+                self.stats.polls,
+                finished - self._logged,
+                self.stats.max_duration,
+                self.interval,
+            )
+
+            self._logged = finished
+            self.stats = self.stats._replace(polls=0, max_duration=0)
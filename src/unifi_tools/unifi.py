@@ -1,16 +1,33 @@
 import asyncio
+import functools
 import json
+import logging
+import os
+import threading
+import time
+from array import array
+from asyncio import AbstractEventLoop
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from json import JSONDecodeError
+from pathlib import Path
+from typing import Callable
 from typing import Dict
 from typing import Final
+from typing import Iterator
 from typing import List
 from typing import NamedTuple
 from typing import Optional
+from typing import Set
 from typing import Tuple
+from typing import Union
 
+import httpx
 import requests
 import sys
+from requests import PreparedRequest
 from requests import Response
+from requests.cookies import RequestsCookieJar
 
 from superbox_utils.asyncio import cancel_tasks
 from superbox_utils.dict.data_dict import DataDict
@@ -22,32 +39,262 @@ from unifi_tools.features import FeatureMap
 from unifi_tools.features import FeaturePort
 
 
+# The controller requests are logged with the API prefix, the request log of the async client only repeats them.
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# The site of a controller without further sites.
+DEFAULT_SITE: Final[str] = "default"
+
+
 class UniFiPort(NamedTuple):
     idx: int
     name: str
     poe_mode: Optional[str]
 
 
+UniFiPortKey = Tuple[str, int]
+
+
+class UniFiPortStore:
+    """Columnar store for the ports of all devices.
+
+    Every port is a row in parallel arrays. PoE modes and port names are stored as
+    codes into lookup tables, so large fleets need a fraction of the memory of one
+    object per port.
+    """
+
+    def __init__(self):
+        self.device_ids: List[str] = []
+        self.device_idx: array = array("H")
+        self.port_idx: array = array("H")
+        self.poe_mode_code: array = array("B")
+        self.name_code: array = array("I")
+
+        self.poe_modes: List[Optional[str]] = [None]
+        self.names: List[str] = [""]
+
+        self._poe_mode_codes: Dict[Optional[str], int] = {None: 0}
+        self._name_codes: Dict[str, int] = {"": 0}
+
+    def __len__(self) -> int:
+        return len(self.port_idx)
+
+    @staticmethod
+    def _encode(value, values: list, codes: dict) -> int:
+        code: Optional[int] = codes.get(value)
+
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+
+        return code
+
+    def add_device(self, device_id: str) -> int:
+        self.device_ids.append(device_id)
+        return len(self.device_ids) - 1
+
+    def add(self, device_index: int, port_idx: int, name: str, poe_mode: Optional[str]) -> int:
+        self.device_idx.append(device_index)
+        self.port_idx.append(port_idx)
+        self.poe_mode_code.append(self._encode(poe_mode, self.poe_modes, self._poe_mode_codes))
+        self.name_code.append(self._encode(name, self.names, self._name_codes))
+
+        return len(self.port_idx) - 1
+
+    def update(self, row: int, name: str, poe_mode: Optional[str]) -> bool:
+        """Update a row and return ``True`` if it changed."""
+        poe_mode_code: int = self._encode(poe_mode, self.poe_modes, self._poe_mode_codes)
+        name_code: int = self._encode(name, self.names, self._name_codes)
+
+        if self.poe_mode_code[row] == poe_mode_code and self.name_code[row] == name_code:
+            return False
+
+        self.poe_mode_code[row] = poe_mode_code
+        self.name_code[row] = name_code
+
+        return True
+
+    def name(self, row: int) -> str:
+        return self.names[self.name_code[row]]
+
+    def poe_mode(self, row: int) -> Optional[str]:
+        return self.poe_modes[self.poe_mode_code[row]]
+
+    def port(self, row: int) -> UniFiPort:
+        return UniFiPort(idx=self.port_idx[row], name=self.name(row), poe_mode=self.poe_mode(row))
+
+
+class UniFiPorts(Mapping):
+    """Ports of one device as a ``port_idx -> UniFiPort`` mapping over the port store."""
+
+    __slots__ = ("store", "device_id", "device_index", "rows", "changed", "_len")
+
+    # Marks a port_idx without a row.
+    NO_ROW: Final[int] = -1
+
+    def __init__(self, store: UniFiPortStore, device_id: str, changed: Optional[Set[UniFiPortKey]] = None):
+        self.store: UniFiPortStore = store
+        self.device_id: str = device_id
+        self.device_index: int = store.add_device(device_id)
+        # Row in the port store by port_idx.
+        self.rows: array = array("l")
+        # Keys of the changed ports, shared with the device map.
+        self.changed: Set[UniFiPortKey] = set() if changed is None else changed
+        self._len: int = 0
+
+    def __getitem__(self, port_idx: int) -> UniFiPort:
+        return self.store.port(self.row(port_idx))
+
+    def __setitem__(self, port_idx: int, port_info: UniFiPort):
+        self.set(port_idx, name=port_info.name, poe_mode=port_info.poe_mode)
+
+    def __iter__(self) -> Iterator[int]:
+        return (port_idx for port_idx, row in enumerate(self.rows) if row != self.NO_ROW)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def row(self, port_idx: int) -> int:
+        row: int = self.rows[port_idx] if 0 <= port_idx < len(self.rows) else self.NO_ROW
+
+        if row == self.NO_ROW:
+            raise KeyError(port_idx)
+
+        return row
+
+    def set(self, port_idx: int, name: str, poe_mode: Optional[str]) -> bool:
+        """Add or update a port and return ``True`` if it changed."""
+        if port_idx >= len(self.rows):
+            self.rows.extend([self.NO_ROW] * (port_idx + 1 - len(self.rows)))
+
+        row: int = self.rows[port_idx]
+
+        if row == self.NO_ROW:
+            self.rows[port_idx] = self.store.add(self.device_index, port_idx, name=name, poe_mode=poe_mode)
+            self._len += 1
+        elif not self.store.update(row, name=name, poe_mode=poe_mode):
+            return False
+
+        self.changed.add((self.device_id, port_idx))
+
+        return True
+
+
 class UniFiDeviceMap(DataDict):
-    def initialise(self, device_infos: List[dict]):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.ports: UniFiPortStore = UniFiPortStore()
+        self._changed: Set[UniFiPortKey] = set()
+        self._cfgversions: Dict[str, str] = {}
+        # Raw port overrides per device as compact JSON and the monotonic time they were last confirmed.
+        # The parsed dicts would cost several hundred bytes per port, only PoE commands need them.
+        self._port_overrides: Dict[str, bytes] = {}
+        self._port_overrides_updated: Dict[str, float] = {}
+
+    def _update_ports(self, device_id: str, ports: UniFiPorts, port_overrides: List[dict]) -> Set[UniFiPortKey]:
+        changed: Set[UniFiPortKey] = set()
+
+        for port in port_overrides:
+            port_idx: int = port[FeatureConst.PORT_IDX]
+
+            # The ports record the key in the changed ports of the map.
+            if ports.set(port_idx, name=port.get(FeatureConst.PORT_NAME, ""), poe_mode=port.get(FeatureConst.POE_MODE)):
+                changed.add((device_id, port_idx))
+
+        return changed
+
+    def initialise(self, device_infos: List[dict], site: str = DEFAULT_SITE) -> Set[UniFiPortKey]:
+        """Merge the device list of a site into the map and return the ports that changed."""
+        changed: Set[UniFiPortKey] = set()
+
         for device_info in device_infos:
             if device_info.get("adopted") is True:
                 device_id: str = device_info.pop("_id")
-                ports: Dict[str, UniFiPort] = {}
+                device: Optional[dict] = self.data.get(device_id)
+                cfgversion: Optional[str] = device_info.get("cfgversion")
 
-                for port in device_info.get("port_overrides", []):
-                    ports[port[FeatureConst.PORT_IDX]] = UniFiPort(
-                        idx=port[FeatureConst.PORT_IDX],
-                        name=port.get(FeatureConst.PORT_NAME),
-                        poe_mode=port.get(FeatureConst.POE_MODE),
-                    )
+                # The controller bumps the cfgversion on every configuration change (e.g. port overrides).
+                if device is not None and cfgversion and self._cfgversions.get(device_id) == cfgversion:
+                    self._port_overrides_updated[device_id] = time.monotonic()
+                    continue
 
-                self.data[device_id] = {
-                    "ports": ports,
-                    "name": device_info["name"],
-                    "model": device_info["model"],
-                    "version": device_info["version"],
-                }
+                if cfgversion:
+                    self._cfgversions[device_id] = cfgversion
+
+                if device is None:
+                    device = {"ports": UniFiPorts(self.ports, device_id, changed=self._changed)}
+                    self.data[device_id] = device
+
+                device["name"] = device_info["name"]
+                device["model"] = device_info["model"]
+                device["version"] = device_info["version"]
+                device["mac"] = device_info.get("mac")
+                device["site"] = site
+
+                port_overrides: List[dict] = device_info.get("port_overrides", [])
+                self.set_port_overrides(device_id, port_overrides)
+
+                changed |= self._update_ports(device_id, device["ports"], port_overrides)
+
+        return changed
+
+    def update_ports(self, device_infos: List[dict]) -> Set[UniFiPortKey]:
+        """Update the ports of known devices from a (partial) device payload, e.g. a websocket event."""
+        changed: Set[UniFiPortKey] = set()
+
+        for device_info in device_infos:
+            device_id: str = device_info.get("_id", "")
+            device: Optional[dict] = self.data.get(device_id)
+
+            if device and "port_overrides" in device_info:
+                changed |= self.apply_port_overrides(device_id, device_info["port_overrides"])
+
+                # Without a cfgversion the next scan must parse this device again.
+                if device_info.get("cfgversion"):
+                    self._cfgversions[device_id] = device_info["cfgversion"]
+                else:
+                    self._cfgversions.pop(device_id, None)
+
+        return changed
+
+    def apply_port_overrides(self, device_id: str, port_overrides: List[dict]) -> Set[UniFiPortKey]:
+        """Update the ports and the cached port overrides of a known device and return the ports that changed."""
+        device: Optional[dict] = self.data.get(device_id)
+
+        if device is None:
+            return set()
+
+        self.set_port_overrides(device_id, port_overrides)
+
+        return self._update_ports(device_id, device["ports"], port_overrides)
+
+    def set_port_overrides(self, device_id: str, port_overrides: List[dict]):
+        self._port_overrides[device_id] = json.dumps(port_overrides, separators=(",", ":")).encode()
+        self._port_overrides_updated[device_id] = time.monotonic()
+
+    def get_port_overrides(self, device_id: str, max_age: int = 0) -> Optional[List[dict]]:
+        """Return a copy of the cached port overrides or ``None`` if they are unknown or older than ``max_age``."""
+        port_overrides: Optional[bytes] = self._port_overrides.get(device_id)
+
+        if port_overrides is None:
+            return None
+
+        if max_age and time.monotonic() - self._port_overrides_updated[device_id] > max_age:
+            return None
+
+        return json.loads(port_overrides)
+
+    def pop_changed(self) -> Set[UniFiPortKey]:
+        """Return all ports changed since the last call."""
+        # Cleared in place, the ports of every device add to the same set.
+        changed: Set[UniFiPortKey] = set(self._changed)
+        self._changed.clear()
+
+        return changed
 
 
 class UniFiAPIResult(NamedTuple):
@@ -55,11 +302,20 @@ class UniFiAPIResult(NamedTuple):
     data: list
 
 
+UniFiAPIResponse = Tuple[Optional[UniFiAPIResult], Optional[Response]]
+AsyncUniFiAPIResponse = Tuple[Optional[UniFiAPIResult], Optional[Union[Response, httpx.Response]]]
+
+
 class UniFiAPI:
+    RENEW_RUNNING: bool = True
+
     LOGIN_ENDPOINT: Final[str] = "/api/login"
     LOGOUT_ENDPOINT: Final[str] = "/api/logout"
-    STATE_DEVICE_ENDPOINT: Final[str] = "/api/s/default/stat/device"
-    REST_DEVICE_ENDPOINT: Final[str] = "/api/s/default/rest/device"
+    SELF_ENDPOINT: Final[str] = "/api/self"
+    SITES_ENDPOINT: Final[str] = "/api/self/sites"
+    STATE_DEVICE_ENDPOINT: Final[str] = "/api/s/{site}/stat/device"
+    REST_DEVICE_ENDPOINT: Final[str] = "/api/s/{site}/rest/device"
+    EVENTS_ENDPOINT: Final[str] = "/wss/s/{site}/events"
 
     @property
     def controller_url(self):
@@ -70,52 +326,196 @@ class UniFiAPI:
 
         return _controller_url
 
+    def events_url(self, site: str = DEFAULT_SITE) -> str:
+        return f"wss{self.controller_url[len('https'):]}{self.EVENTS_ENDPOINT.format(site=site)}"
+
+    @property
+    def cookies(self) -> str:
+        return "; ".join(f"{cookie.name}={cookie.value}" for cookie in self._cookies)
+
     def __init__(self, config: Config):
         self.config: Config = config
         self.rc: int = 0
 
-        self._session = requests.Session()
-        self._session.hooks["response"].append(self._reconnect)
+        # Every executor thread gets its own session. All sessions share the cookie jar with the login cookies.
+        self._sessions: threading.local = threading.local()
+        self._cookies: RequestsCookieJar = RequestsCookieJar()
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=config.unifi_controller.max_workers, thread_name_prefix="unifi-api"
+        )
+
+        # Pooled async client for the async_* methods, unless they run in the thread pool.
+        # It shares the cookie jar with the sessions, so both use the same login.
+        self._client: Optional[httpx.AsyncClient] = None
 
         self._logged_in: bool = False
-        self._login: Optional[Response] = None
+        self._login: Optional[Union[Response, httpx.Response]] = None
+        self.csrf_token: str = ""
+
+        # Concurrent 401 responses share one login. Every successful login starts a new generation,
+        # a request that was sent with an older generation only retries with the new session.
+        self._login_lock: threading.Lock = threading.Lock()
+        self._async_login_lock: Optional[asyncio.Lock] = None
+        self._login_generation: int = 0
+        # Number of logins after the first one, after a 401 response or to renew the session.
+        self.reauth_count: int = 0
+        # Epoch time the session expires, from the cookie expiry or the configured session TTL.
+        self.session_expires: Optional[float] = None
+        self._loop: Optional[AbstractEventLoop] = None
 
         self._headers: Dict[str, str] = {
             "Accept": "application/json",
             "Content-Type": "application/json; charset=utf-8",
         }
 
+    @property
+    def login_generation(self) -> int:
+        return self._login_generation
+
+    @property
+    def _session(self) -> requests.Session:
+        session: Optional[requests.Session] = getattr(self._sessions, "session", None)
+
+        if session is None:
+            session = requests.Session()
+            session.cookies = self._cookies
+            session.hooks["response"].append(self._reconnect)
+            self._sessions.session = session
+
+        return session
+
+    @property
+    def _async_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                cookies=self._cookies,
+                verify=False,
+                # The controller requests have no timeout, like the requests sessions.
+                timeout=None,
+                limits=httpx.Limits(max_connections=self.config.unifi_controller.max_workers),
+            )
+
+        return self._client
+
+    @property
+    def _credentials(self) -> Dict[str, str]:
+        return {
+            "username": self.config.unifi_controller.username,
+            "password": self.config.unifi_controller.password,
+        }
+
     def login(self) -> Tuple[Optional[UniFiAPIResult], Optional[Response]]:
         result, response = self._request_url(
             method="post",
             url=f"{self.controller_url}{self.LOGIN_ENDPOINT}",
             headers=self._headers,
-            json={
-                "username": self.config.unifi_controller.username,
-                "password": self.config.unifi_controller.password,
-            },
+            json=self._credentials,
         )
 
+        self._set_login(result, response)
+
+        return result, response
+
+    def _set_login(self, result: Optional[UniFiAPIResult], response: Optional[Union[Response, httpx.Response]]):
         self._login = response
 
         if result and result.meta.get("rc") == "ok" and response:
             logger.info("%s Successfully logged in.", LogPrefix.API)
             logger.debug("%s CSRF Token: %s", LogPrefix.API, response.cookies.get("csrf_token"))
+            self.csrf_token = response.cookies.get("csrf_token") or ""
             self._logged_in = True
+            self._login_generation += 1
+            self.session_expires = self._get_session_expires()
+
+            if self.config.unifi_controller.session_cache:
+                self._save_session()
+
+    def start_session(self):
+        """Reuse the cached session if it is still valid, otherwise log in."""
+        if self.config.unifi_controller.session_cache and self._load_session():
+            return
+
+        self.login()
+
+    def _save_session(self):
+        path: Path = Path(self.config.unifi_controller.session_cache)
+        data: dict = {
+            "cookies": [
+                {
+                    "name": cookie.name,
+                    "value": cookie.value,
+                    "domain": cookie.domain,
+                    "path": cookie.path,
+                    "expires": cookie.expires,
+                }
+                for cookie in self._cookies
+            ],
+            "csrf_token": self.csrf_token,
+        }
 
-        return result, response
+        try:
+            # The file holds the session credentials, only the owner may read it.
+            fd: int = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
 
-    def logout(self) -> Tuple[Optional[UniFiAPIResult], Optional[Response]]:
-        csrf_token: str = ""
+            with os.fdopen(fd, "w") as f:
+                os.fchmod(f.fileno(), 0o600)
+                json.dump(data, f)
+        except OSError as e:
+            logger.error("%s Can't write session cache: %s", LogPrefix.API, e)
+
+    def _load_session(self) -> bool:
+        path: Path = Path(self.config.unifi_controller.session_cache)
 
-        if self._login:
-            csrf_token = self._login.cookies.get("csrf_token", "")
+        try:
+            data: dict = json.loads(path.read_text())
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.error("%s Can't read session cache: %s", LogPrefix.API, e)
+            return False
+
+        for cookie in data.get("cookies", []):
+            self._cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/"),
+                expires=cookie.get("expires"),
+            )
 
+        # A cheap request tells if the controller still accepts the session.
+        self._sessions.retrying = True
+
+        try:
+            response: Response = self._session.get(
+                f"{self.controller_url}{self.SELF_ENDPOINT}", headers=self._headers, verify=False
+            )
+            valid: bool = response.status_code == requests.codes.ok
+        except requests.RequestException as e:
+            logger.debug("%s %s", LogPrefix.API, e)
+            valid = False
+        finally:
+            self._sessions.retrying = False
+
+        if not valid:
+            logger.info("%s Cached session expired.", LogPrefix.API)
+            self._cookies.clear()
+            return False
+
+        logger.info("%s Reusing cached session.", LogPrefix.API)
+        self.csrf_token = data.get("csrf_token", "")
+        self._logged_in = True
+        self._login_generation += 1
+        self.session_expires = self._get_session_expires()
+
+        return True
+
+    def logout(self) -> Tuple[Optional[UniFiAPIResult], Optional[Response]]:
         result, response = self._request_url(
             method="post",
             url=f"{self.controller_url}{self.LOGOUT_ENDPOINT}",
             headers={
-                "x-csrf-token": csrf_token,
+                "x-csrf-token": self.csrf_token,
             },
         )
 
@@ -124,10 +524,24 @@ class UniFiAPI:
 
         return result, response
 
-    def list_all_devices(self, log: bool = True) -> Tuple[Optional[UniFiAPIResult], Optional[Response]]:
+    def list_sites(self) -> UniFiAPIResponse:
+        result, response = self._request_url(
+            method="get",
+            url=f"{self.controller_url}{self.SITES_ENDPOINT}",
+            headers=self._headers,
+        )
+
+        if result and result.data:
+            logger.debug("%s [list_sites] %s", LogPrefix.API, [site.get("name") for site in result.data])
+
+        return result, response
+
+    def list_all_devices(
+        self, site: str = DEFAULT_SITE, log: bool = True
+    ) -> Tuple[Optional[UniFiAPIResult], Optional[Response]]:
         result, response = self._request_url(
             method="get",
-            url=f"{self.controller_url}{ self.STATE_DEVICE_ENDPOINT}",
+            url=f"{self.controller_url}{self.STATE_DEVICE_ENDPOINT.format(site=site)}",
             headers=self._headers,
             log=log,
         )
@@ -137,12 +551,25 @@ class UniFiAPI:
 
         return result, response
 
+    def get_device(self, mac: str, site: str = DEFAULT_SITE, log: bool = True) -> UniFiAPIResponse:
+        result, response = self._request_url(
+            method="get",
+            url=f"{self.controller_url}{self.STATE_DEVICE_ENDPOINT.format(site=site)}/{mac}",
+            headers=self._headers,
+            log=log,
+        )
+
+        if result and result.data and log is True:
+            logger.debug("%s [get_device] %s", LogPrefix.API, result.data)
+
+        return result, response
+
     def update_device(
-        self, device_id: str, port_overrides: Dict[str, list]
+        self, device_id: str, port_overrides: Dict[str, list], site: str = DEFAULT_SITE
     ) -> Tuple[Optional[UniFiAPIResult], Optional[Response]]:
         result, response = self._request_url(
             method="put",
-            url=f"{self.controller_url}{self.REST_DEVICE_ENDPOINT}/{device_id}",
+            url=f"{self.controller_url}{self.REST_DEVICE_ENDPOINT.format(site=site)}/{device_id}",
             headers=self._headers,
             json=port_overrides,
         )
@@ -151,12 +578,175 @@ class UniFiAPI:
 
         return result, response
 
+    async def async_login(self) -> AsyncUniFiAPIResponse:
+        if self.config.unifi_controller.thread_pool:
+            return await self._run_in_executor(self.login)
+
+        # A rejected login must not log in again.
+        result, response = await self._async_request_url(
+            method="post",
+            url=f"{self.controller_url}{self.LOGIN_ENDPOINT}",
+            headers=self._headers,
+            json=self._credentials,
+            retry=False,
+        )
+
+        self._set_login(result, response)
+
+        return result, response
+
+    async def async_reauthenticate(self, generation: int) -> bool:
+        """Log in again unless another caller already did since ``generation``. Returns ``True`` if this call logged in."""
+        if self.config.unifi_controller.thread_pool:
+            self._loop = asyncio.get_running_loop()
+            return await self._loop.run_in_executor(self._executor, self.reauthenticate, generation)
+
+        # The lock is created on the running event loop.
+        if self._async_login_lock is None:
+            self._async_login_lock = asyncio.Lock()
+
+        async with self._async_login_lock:
+            if self._login_generation != generation:
+                return False
+
+            self._logged_in = False
+            await self.async_login()
+            self.reauth_count += 1
+
+            return True
+
+    async def async_list_sites(self) -> AsyncUniFiAPIResponse:
+        if self.config.unifi_controller.thread_pool:
+            return await self._run_in_executor(self.list_sites)
+
+        result, response = await self._async_request_url(
+            method="get",
+            url=f"{self.controller_url}{self.SITES_ENDPOINT}",
+            headers=self._headers,
+        )
+
+        if result and result.data:
+            logger.debug("%s [list_sites] %s", LogPrefix.API, [site.get("name") for site in result.data])
+
+        return result, response
+
+    async def async_list_all_devices(self, site: str = DEFAULT_SITE, log: bool = True) -> AsyncUniFiAPIResponse:
+        if self.config.unifi_controller.thread_pool:
+            return await self._run_in_executor(self.list_all_devices, site=site, log=log)
+
+        result, response = await self._async_request_url(
+            method="get",
+            url=f"{self.controller_url}{self.STATE_DEVICE_ENDPOINT.format(site=site)}",
+            headers=self._headers,
+            log=log,
+        )
+
+        if result and result.data and log is True:
+            logger.debug("%s [list_all_devices] %s", LogPrefix.API, result.data)
+
+        return result, response
+
+    async def async_get_device(self, mac: str, site: str = DEFAULT_SITE, log: bool = True) -> AsyncUniFiAPIResponse:
+        if self.config.unifi_controller.thread_pool:
+            return await self._run_in_executor(self.get_device, mac=mac, site=site, log=log)
+
+        result, response = await self._async_request_url(
+            method="get",
+            url=f"{self.controller_url}{self.STATE_DEVICE_ENDPOINT.format(site=site)}/{mac}",
+            headers=self._headers,
+            log=log,
+        )
+
+        if result and result.data and log is True:
+            logger.debug("%s [get_device] %s", LogPrefix.API, result.data)
+
+        return result, response
+
+    async def async_update_device(
+        self, device_id: str, port_overrides: Dict[str, list], site: str = DEFAULT_SITE
+    ) -> AsyncUniFiAPIResponse:
+        if self.config.unifi_controller.thread_pool:
+            return await self._run_in_executor(
+                self.update_device, device_id=device_id, port_overrides=port_overrides, site=site
+            )
+
+        result, response = await self._async_request_url(
+            method="put",
+            url=f"{self.controller_url}{self.REST_DEVICE_ENDPOINT.format(site=site)}/{device_id}",
+            headers=self._headers,
+            json=port_overrides,
+        )
+
+        logger.debug("%s [update_device] %s", LogPrefix.API, device_id)
+
+        return result, response
+
+    async def _run_in_executor(self, func: Callable[..., UniFiAPIResponse], **kwargs) -> UniFiAPIResponse:
+        # The blocking request runs outside the event loop, so MQTT traffic keeps flowing while the controller answers.
+        self._loop = asyncio.get_running_loop()
+        return await self._loop.run_in_executor(self._executor, functools.partial(func, **kwargs))
+
+    async def async_close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    async def _async_request_url(
+        self, url, method: str, headers: dict, json: Optional[dict] = None, log: bool = True, retry: bool = True
+    ) -> Tuple[Optional[UniFiAPIResult], Optional[httpx.Response]]:
+        result: Optional[UniFiAPIResult] = None
+        response: Optional[httpx.Response] = None
+
+        self._loop = asyncio.get_running_loop()
+        # A 401 is retried only if no other request logged in since this one was sent.
+        generation: int = self._login_generation
+
+        try:
+            response = await self._async_client.request(method=method, url=url, headers=headers, json=json)
+
+            if retry and response.status_code == httpx.codes.UNAUTHORIZED:
+                logger.debug("%s %s", LogPrefix.API, self._get_meta_info(self._get_meta(response.text), response.url))
+
+                # Send the request again with the cookies of the new session.
+                await self.async_reauthenticate(generation)
+                response = await self._async_client.request(method=method, url=url, headers=headers, json=json)
+
+            response.raise_for_status()
+        except httpx.TransportError as e:
+            logger.debug("%s %s", LogPrefix.API, e)
+            self._exit(1)
+        except httpx.HTTPStatusError as e:
+            # Same message as the requests sessions, so the log does not depend on the client.
+            logger.error(
+                "%s %s %s Error: %s for url: %s",
+                LogPrefix.API,
+                e.response.status_code,
+                "Client" if e.response.is_client_error else "Server",
+                e.response.reason_phrase,
+                e.response.url,
+            )
+            self._exit(1)
+        finally:
+            if response is not None and not response.is_error:
+                result = self._get_json(response)
+
+                if result and log is True:
+                    logger.debug("%s %s", LogPrefix.API, self._get_meta_info(result.meta, response.url))
+
+        return result, response
+
     def _request_url(
         self, url, method: str, headers: dict, json: Optional[dict] = None, log: bool = True
     ) -> Tuple[Optional[UniFiAPIResult], Optional[Response]]:
         result: Optional[UniFiAPIResult] = None
         response: Optional[Response] = None
 
+        # The response hook retries a 401 only if no other request logged in since this one was sent.
+        self._sessions.generation = self._login_generation
+
         try:
             response = self._session.request(
                 method=method,
@@ -177,15 +767,23 @@ class UniFiAPI:
             if response:
                 result = self._get_json(response)
 
-                if result:
-                    meta_info: str = f"""[{result.meta.get('rc')}]{f" {result.meta['msg']}" if result.meta.get('msg') else ""} {response.url}"""
-
-                    if log is True:
-                        logger.debug("%s %s", LogPrefix.API, meta_info)
+                if result and log is True:
+                    logger.debug("%s %s", LogPrefix.API, self._get_meta_info(result.meta, response.url))
 
         return result, response
 
-    def _get_json(self, response: Response) -> Optional[UniFiAPIResult]:
+    @staticmethod
+    def _get_meta(text: str) -> dict:
+        try:
+            return json.loads(text).get("meta", {})
+        except (JSONDecodeError, AttributeError):
+            return {}
+
+    @staticmethod
+    def _get_meta_info(meta: dict, url) -> str:
+        return f"""[{meta.get('rc')}]{f" {meta['msg']}" if meta.get('msg') else ""} {url}"""
+
+    def _get_json(self, response: Union[Response, httpx.Response]) -> Optional[UniFiAPIResult]:
         result: Optional[UniFiAPIResult] = None
 
         try:
@@ -197,24 +795,80 @@ class UniFiAPI:
 
         return result
 
-    def _reconnect(self, response: Response, *args, **kwargs):
-        if response.status_code == requests.codes.unauthorized:
-            data: dict = json.loads(response.text)
-            meta: dict = data.get("meta", {})
+    def _get_session_expires(self) -> Optional[float]:
+        expires: List[float] = [float(cookie.expires) for cookie in self._cookies if cookie.expires]
 
-            logger.debug(
-                "[API] %s", f"""[{meta.get('rc')}]{f" {meta['msg']}" if meta.get('msg') else ""} {response.url}"""
-            )
+        if self.config.unifi_controller.session_ttl:
+            expires.append(time.time() + self.config.unifi_controller.session_ttl)
+
+        return min(expires) if expires else None
+
+    async def renew_session(self):
+        """Log in again shortly before the session expires, so no request has to wait for a login after a 401."""
+        while self.RENEW_RUNNING and self.session_expires:
+            session_expires: float = self.session_expires
+            renew_at: float = session_expires - self.config.unifi_controller.session_renew_margin
+
+            await asyncio.sleep(max(renew_at - time.time(), 0))
+
+            logger.info("%s Renewing the session.", LogPrefix.API)
+            await self.async_reauthenticate(self._login_generation)
+
+            # Without a later expiry the next renewal would start immediately again.
+            if (self.session_expires or 0) <= session_expires:
+                logger.error("%s Session expiry did not advance. Stop renewing the session.", LogPrefix.API)
+                break
+
+    def reauthenticate(self, generation: int) -> bool:
+        """Log in again unless another caller already did since ``generation``. Returns ``True`` if this call logged in."""
+        with self._login_lock:
+            if self._login_generation != generation:
+                return False
 
             self._logged_in = False
-            self.login()
 
-            return self._session.send(response.request, verify=False)
+            # A rejected login must not reach the response hook, it would wait for this lock forever.
+            retrying: bool = getattr(self._sessions, "retrying", False)
+            self._sessions.retrying = True
+
+            try:
+                self.login()
+            finally:
+                self._sessions.retrying = retrying
+
+            self.reauth_count += 1
+
+            return True
+
+    def _reconnect(self, response: Response, *args, **kwargs):
+        # The login and the retried request must not retry again, otherwise a rejected login recurses.
+        if response.status_code != requests.codes.unauthorized or getattr(self._sessions, "retrying", False):
+            return None
+
+        logger.debug("%s %s", LogPrefix.API, self._get_meta_info(self._get_meta(response.text), response.url))
+
+        generation: int = getattr(self._sessions, "generation", self._login_generation)
+        self._sessions.retrying = True
+
+        try:
+            self.reauthenticate(generation)
+
+            # Send the request again with the cookies of the new session.
+            request: PreparedRequest = response.request.copy()
+            request.headers.pop("Cookie", None)
+            request.prepare_cookies(self._cookies)
+
+            return self._session.send(request, verify=False)
+        finally:
+            self._sessions.retrying = False
 
     def _exit(self, rc):
         self.rc = rc
 
-        if asyncio.get_event_loop().is_running():
+        if self._loop and self._loop.is_running():
+            # May be called from an executor thread, so hand over to the event loop thread.
+            self._loop.call_soon_threadsafe(cancel_tasks)
+        elif asyncio.get_event_loop().is_running():
             cancel_tasks()
         else:
             sys.exit(rc)
@@ -231,30 +885,142 @@ class UniFiDevices:
         self.unifi_device_map = UniFiDeviceMap()
         self.features = FeatureMap()
         self.config: Config = unifi_api.config
+        self.sites: List[str] = list(self.config.unifi_controller.sites)
 
-    def get_device_info(self, device_id: str) -> dict:
-        result, response = self.unifi_api.list_all_devices()
-        device_info: dict = {}
+        # Pending PoE modes per device and port, written together after the command window.
+        self._pending_ports: Dict[str, Dict[int, str]] = {}
+        self._pending_tasks: Dict[str, asyncio.Task] = {}
+        self._update_locks: Dict[str, asyncio.Lock] = {}
 
-        if result:
-            adopted_devices_list: List[dict] = [
-                device for device in result.data if device.get("adopted") and device.get("_id") == device_id
-            ]
+    def get_site(self, device_id: str) -> str:
+        device: Optional[dict] = self.unifi_device_map.get(device_id)
+
+        if device:
+            return device.get("site", DEFAULT_SITE)
+
+        return DEFAULT_SITE
+
+    async def get_port_overrides(self, device_id: str) -> List[dict]:
+        """Return the port overrides of a device from the device map and read the device only if the cache is too old."""
+        port_overrides: Optional[List[dict]] = self.unifi_device_map.get_port_overrides(
+            device_id, max_age=self.config.unifi_controller.cache_max_age
+        )
+
+        if port_overrides is None:
+            await self.refresh_device(device_id)
+            port_overrides = self.unifi_device_map.get_port_overrides(device_id)
+
+        return port_overrides or []
+
+    @staticmethod
+    def _set_port_poe(port_info: dict, poe_mode: str) -> bool:
+        # Only update port if PoE mode is allowed and has changed!
+        if (
+            port_info.get(FeatureConst.POE_MODE)
+            and poe_mode in FeatureConst.POE_MODES
+            and port_info[FeatureConst.POE_MODE] != poe_mode
+        ):
+            port_info[FeatureConst.POE_MODE] = poe_mode
+            return True
+
+        return False
+
+    async def _update_ports(self, device_id: str) -> Set[int]:
+        await asyncio.sleep(self.config.unifi_controller.command_window)
+
+        # Commands received from now on start the next batch for this device.
+        pending_ports: Dict[int, str] = self._pending_ports.pop(device_id, {})
+        self._pending_tasks.pop(device_id, None)
+
+        updated_ports: Set[int] = set()
+
+        # A batch must not read the port overrides before the previous batch has written them.
+        async with self._update_locks.setdefault(device_id, asyncio.Lock()):
+            port_overrides: List[dict] = await self.get_port_overrides(device_id)
+
+            for port in port_overrides:
+                port_idx: int = port[FeatureConst.PORT_IDX]
+
+                if port_idx in pending_ports and self._set_port_poe(port, pending_ports[port_idx]):
+                    updated_ports.add(port_idx)
+
+            if updated_ports:
+                result, response = await self.unifi_api.async_update_device(
+                    device_id=device_id,
+                    port_overrides={"port_overrides": port_overrides},
+                    site=self.get_site(device_id),
+                )
+
+                # Apply the written port overrides. The read back device often still has the old cfgversion
+                # and is skipped then, so the new PoE modes would only be published after the next cfgversion.
+                if result:
+                    self.unifi_device_map.apply_port_overrides(device_id, port_overrides)
+
+                # The publish loop picks up the changed ports of this device without a full scan.
+                await self.refresh_device(device_id)
+
+        return updated_ports
+
+    async def update_port(self, device_id: str, port_idx: int, poe_mode: str) -> bool:
+        """Queue a PoE mode for a port and wait until its batch is written.
+
+        All commands for the same device within ``command_window`` seconds are written
+        with a single ``update_device`` call. Returns ``True`` if the port was changed.
+        """
+        self._pending_ports.setdefault(device_id, {})[port_idx] = poe_mode
+        task: Optional[asyncio.Task] = self._pending_tasks.get(device_id)
 
-            if adopted_devices_list:
-                device_info = adopted_devices_list[0]
+        if task is None:
+            task = asyncio.create_task(self._update_ports(device_id))
+            self._pending_tasks[device_id] = task
 
-        return device_info
+        # Shield the batch, a cancelled command must not cancel the other commands in it.
+        updated_ports: Set[int] = await asyncio.shield(task)
 
-    def scan(self):
-        result, response = self.unifi_api.list_all_devices(log=False)
+        return port_idx in updated_ports
+
+    async def _scan_site(self, site: str) -> Set[UniFiPortKey]:
+        result, response = await self.unifi_api.async_list_all_devices(site=site, log=False)
 
         if result:
-            self.unifi_device_map.initialise(result.data)
+            return self.unifi_device_map.initialise(result.data, site=site)
+
+        return set()
+
+    async def scan(self) -> Set[UniFiPortKey]:
+        # All sites are read at the same time over the same session.
+        changed: List[Set[UniFiPortKey]] = await asyncio.gather(*(self._scan_site(site) for site in self.sites))
+
+        return set().union(*changed)
+
+    async def read_sites(self):
+        if not self.config.unifi_controller.all_sites:
+            return
+
+        result, response = await self.unifi_api.async_list_sites()
+
+        if result and result.data:
+            self.sites = [site["name"] for site in result.data if site.get("name")]
+            logger.info("%s Found %s sites.", LogPrefix.API, len(self.sites))
+
+    async def refresh_device(self, device_id: str) -> Set[UniFiPortKey]:
+        """Read a single device instead of the whole site, e.g. after a PoE command."""
+        device: Optional[dict] = self.unifi_device_map.get(device_id)
+
+        if device and device.get("mac"):
+            site: str = device.get("site", DEFAULT_SITE)
+            result, response = await self.unifi_api.async_get_device(mac=device["mac"], site=site, log=False)
+
+            if result:
+                return self.unifi_device_map.initialise(result.data, site=site)
+
+        return set()
+
+    async def read_devices(self):
+        await self.read_sites()
 
-    def read_devices(self):
         logger.info("%s Reading adopted devices.", LogPrefix.API)
-        self.scan()
+        await self.scan()
 
         if self.unifi_device_map is None:
             logger.debug("%s Can't read adopted devices!", LogPrefix.API)
@@ -6,11 +6,9 @@ from typing import Set
 from unittest.mock import AsyncMock
 
 import pytest
-import responses
+import respx
 from _pytest.logging import LogCaptureFixture
 from asyncio_mqtt import Client
-from responses import matchers
-from responses.registries import OrderedRegistry
 
 from conftest import ConfigLoader
 from conftest_data import CONFIG_CONTENT
@@ -25,20 +23,17 @@ from unittests.test_unifi_api_data import RESPONSE_HEADER
 
 
 class TestHappyPathHassBinarySensorsMqttPlugin(TestUniFiApi):
-    @responses.activate(registry=OrderedRegistry)
+    @respx.mock
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
     def test_init_tasks(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
         async def run():
-            mock_list_all_devices_response_1 = responses.get(
-                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
-                json=json.loads(devices_json_response_2),
-                match=[matchers.header_matcher(RESPONSE_HEADER)],
-            )
-
-            responses.add(mock_list_all_devices_response_1)
+            respx.get(
+                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+                headers=RESPONSE_HEADER,
+            ).respond(json=json.loads(devices_json_response_2))
 
             unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-            unifi_devices.read_devices()
+            await unifi_devices.read_devices()
 
             mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
             plugin: HassBinarySensorsMqttPlugin = HassBinarySensorsMqttPlugin(
@@ -78,19 +73,18 @@ class TestHappyPathHassBinarySensorsMqttPlugin(TestUniFiApi):
         loop = asyncio.new_event_loop()
         loop.run_until_complete(run())
 
-    @responses.activate(registry=OrderedRegistry)
+    @respx.mock
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
     def test_discovery_message(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
-        mock_list_all_devices_response_1 = responses.get(
-            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
-            json=json.loads(devices_json_response_2),
-            match=[matchers.header_matcher(RESPONSE_HEADER)],
-        )
-
-        responses.add(mock_list_all_devices_response_1)
+        respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(devices_json_response_2))
 
         unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-        unifi_devices.read_devices()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(unifi_devices.read_devices())
 
         mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
         plugin: HassBinarySensorsMqttPlugin = HassBinarySensorsMqttPlugin(
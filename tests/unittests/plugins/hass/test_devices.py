@@ -0,0 +1,153 @@
+import asyncio
+import json
+from asyncio import Task
+from contextlib import AsyncExitStack
+from typing import List
+from typing import Set
+from unittest.mock import AsyncMock
+
+import pytest
+import respx
+from _pytest.logging import LogCaptureFixture
+from asyncio_mqtt import Client
+
+from conftest import ConfigLoader
+from conftest_data import CONFIG_CONTENT
+from unifi_tools.plugins.hass.devices import HassDevicesDiscovery
+from unifi_tools.plugins.hass.devices import HassDevicesMqttPlugin
+from unifi_tools.unifi import UniFiAPI
+from unifi_tools.unifi import UniFiDevices
+from unittests.plugins.test_features import MockMQTTMessages
+from unittests.plugins.test_features_data import devices_json_response_2
+from unittests.test_unifi_api import TestUniFiApi
+from unittests.test_unifi_api_data import RESPONSE_HEADER
+
+
+class TestHappyPathHassDevicesMqttPlugin(TestUniFiApi):
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_init_tasks(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        async def run():
+            respx.get(
+                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+                headers=RESPONSE_HEADER,
+            ).respond(json=json.loads(devices_json_response_2))
+
+            unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+            await unifi_devices.read_devices()
+
+            # The broker still holds a per port config from the per port discovery.
+            mock_mqtt_retained: AsyncMock = AsyncMock()
+            mock_mqtt_retained.__aenter__.return_value = MockMQTTMessages(
+                [("homeassistant/switch/mocked_unifi/mocked_id-port-1/config", b"""{"name": "MOCKED Port 1"}""")]
+            )
+
+            mock_mqtt_empty: AsyncMock = AsyncMock()
+            mock_mqtt_empty.__aenter__.return_value = MockMQTTMessages([])
+
+            mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
+            mock_mqtt_client.filtered_messages.side_effect = lambda topic: (
+                mock_mqtt_retained if topic == "homeassistant/switch/mocked_unifi/+/config" else mock_mqtt_empty
+            )
+
+            plugin: HassDevicesMqttPlugin = HassDevicesMqttPlugin(
+                unifi_devices=unifi_devices, mqtt_client=mock_mqtt_client
+            )
+
+            async with AsyncExitStack() as stack:
+                tasks: Set[Task] = set()
+
+                await stack.enter_async_context(mock_mqtt_client)
+
+                plugin_tasks = await plugin.init_tasks()
+                tasks.update(plugin_tasks)
+
+                await asyncio.gather(*tasks)
+
+            published: dict = {call.args[0]: call.args[1] for call in mock_mqtt_client.publish.await_args_list}
+
+            assert b"" == published["homeassistant/switch/mocked_unifi/mocked_id-port-1/config"]
+            assert 2 == len(published)
+
+            message: dict = json.loads(published["homeassistant/device/mocked_unifi/mocked_id/config"])
+
+            assert {
+                "name": "MOCKED SWITCH",
+                "identifiers": "MOCKED_DEVICE_ID",
+                "model": "MOCKED MODEL",
+                "sw_version": "MOCKED 6.2.14.13855",
+                "manufacturer": "Ubiquiti Inc.",
+            } == message["device"]
+            assert "UniFi Tools" == message["origin"]["name"]
+            assert 2 == message["qos"]
+            assert 6 == len(message["components"])
+
+            switch: dict = message["components"]["mocked_unifi-mocked_id-port-1-switch"]
+
+            assert "switch" == switch["platform"]
+            assert "mocked_unifi-mocked_device_id-port-1" == switch["unique_id"]
+            assert "mocked_unifi/mocked_id-port-1/set" == switch["command_topic"]
+            assert "device" not in switch
+
+            binary_sensor: dict = message["components"]["mocked_unifi-mocked_id-port-1-binary_sensor"]
+
+            assert "binary_sensor" == binary_sensor["platform"]
+            assert "mocked_unifi/mocked_id-port-1/get" == binary_sensor["state_topic"]
+
+            logs: list = [record.getMessage() for record in caplog.records]
+
+            assert "[MQTT] Removed 1 retained switch discovery configs." in logs
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_remove_port_configs(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        async def run():
+            topics: List[str] = [
+                f"homeassistant/switch/mocked_unifi/mocked_id-port-{idx}/config" for idx in range(1, 21)
+            ]
+
+            mock_mqtt_retained: AsyncMock = AsyncMock()
+            mock_mqtt_retained.__aenter__.return_value = MockMQTTMessages(
+                [(topic, b"""{"name": "MOCKED Port"}""") for topic in topics]
+            )
+
+            mock_mqtt_empty: AsyncMock = AsyncMock()
+            mock_mqtt_empty.__aenter__.return_value = MockMQTTMessages([])
+
+            in_flight: int = 0
+            max_in_flight: int = 0
+
+            async def publish(*args, **kwargs):
+                nonlocal in_flight, max_in_flight
+
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+            mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
+            mock_mqtt_client.filtered_messages.side_effect = lambda topic: (
+                mock_mqtt_retained if topic == "homeassistant/switch/mocked_unifi/+/config" else mock_mqtt_empty
+            )
+            mock_mqtt_client.publish.side_effect = publish
+
+            discovery: HassDevicesDiscovery = HassDevicesDiscovery(
+                unifi_devices=UniFiDevices(unifi_api=unifi_api), mqtt_client=mock_mqtt_client
+            )
+            await discovery._remove_port_configs()
+
+            published: dict = {call.args[0]: call.args[1] for call in mock_mqtt_client.publish.await_args_list}
+
+            assert dict.fromkeys(topics, b"") == published
+
+            # The configs are cleared with up to discovery_window publishes in flight.
+            assert 1 < max_in_flight <= unifi_api.config.homeassistant.discovery_window
+
+            logs: list = [record.getMessage() for record in caplog.records]
+
+            assert "[MQTT] Removed 20 retained switch discovery configs." in logs
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
@@ -6,11 +6,9 @@ from typing import Set
 from unittest.mock import AsyncMock
 
 import pytest
-import responses
+import respx
 from _pytest.logging import LogCaptureFixture
 from asyncio_mqtt import Client
-from responses import matchers
-from responses.registries import OrderedRegistry
 
 from conftest import ConfigLoader
 from conftest_data import CONFIG_CONTENT
@@ -19,26 +17,24 @@ from unifi_tools.plugins.hass.switches import HassSwitchesDiscovery
 from unifi_tools.plugins.hass.switches import HassSwitchesMqttPlugin
 from unifi_tools.unifi import UniFiAPI
 from unifi_tools.unifi import UniFiDevices
+from unittests.plugins.test_features import MockMQTTMessages
 from unittests.plugins.test_features_data import devices_json_response_2
 from unittests.test_unifi_api import TestUniFiApi
 from unittests.test_unifi_api_data import RESPONSE_HEADER
 
 
 class TestHappyPathHassSwitchesMqttPlugin(TestUniFiApi):
-    @responses.activate(registry=OrderedRegistry)
+    @respx.mock
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
     def test_init_tasks(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
         async def run():
-            mock_list_all_devices_response_1 = responses.get(
-                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
-                json=json.loads(devices_json_response_2),
-                match=[matchers.header_matcher(RESPONSE_HEADER)],
-            )
-
-            responses.add(mock_list_all_devices_response_1)
+            respx.get(
+                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+                headers=RESPONSE_HEADER,
+            ).respond(json=json.loads(devices_json_response_2))
 
             unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-            unifi_devices.read_devices()
+            await unifi_devices.read_devices()
 
             mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
             plugin: HassSwitchesMqttPlugin = HassSwitchesMqttPlugin(
@@ -61,6 +57,12 @@ class TestHappyPathHassSwitchesMqttPlugin(TestUniFiApi):
             logs: list = [record.getMessage() for record in caplog.records]
 
             assert "[API] Reading adopted devices." in logs
+            assert any(
+                log.startswith("[MQTT] Published 3 discovery messages in ") for log in logs
+            ), "Missing discovery timing log"
+
+            for call in mock_mqtt_client.publish.await_args_list:
+                assert {"qos": 2, "retain": True} == call.kwargs
 
             assert (
                 '[MQTT] [homeassistant/switch/mocked_unifi/mocked_id-port-1/config] Publishing message: {"name": "MOCKED Port 1", "unique_id": "mocked_unifi-mocked_device_id-port-1", "object_id": "mocked_unifi-mocked_id-port-1", "command_topic": "mocked_unifi/mocked_id-port-1/set", "state_topic": "mocked_unifi/mocked_id-port-1/get", "value_template": "{% if value_json.poe_mode in [\'auto\', \'pasv24\'] %}on{% else %}off{% endif %}", "state_on": "on", "state_off": "off", "payload_on": "{\\"poe_mode\\": \\"on\\"}", "payload_off": "{\\"poe_mode\\": \\"off\\"}", "qos": 2, "device": {"name": "MOCKED SWITCH", "identifiers": "MOCKED_DEVICE_ID", "model": "MOCKED MODEL", "sw_version": "MOCKED 6.2.14.13855", "manufacturer": "Ubiquiti Inc."}}'
@@ -78,19 +80,71 @@ class TestHappyPathHassSwitchesMqttPlugin(TestUniFiApi):
         loop = asyncio.new_event_loop()
         loop.run_until_complete(run())
 
-    @responses.activate(registry=OrderedRegistry)
+    @respx.mock
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
-    def test_discovery_message(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
-        mock_list_all_devices_response_1 = responses.get(
-            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
-            json=json.loads(devices_json_response_2),
-            match=[matchers.header_matcher(RESPONSE_HEADER)],
-        )
+    def test_publish_changed_only(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        async def run():
+            respx.get(
+                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+                headers=RESPONSE_HEADER,
+            ).respond(json=json.loads(devices_json_response_2))
+
+            unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+            await unifi_devices.read_devices()
+
+            mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
+            plugin: HassSwitchesMqttPlugin = HassSwitchesMqttPlugin(
+                unifi_devices=unifi_devices, mqtt_client=mock_mqtt_client
+            )
+
+            features = plugin._hass.features.by_feature_type(HassSwitchesDiscovery.publish_feature_types)
+            topic, message = plugin._hass._get_discovery(next(features))
+
+            # The broker holds the current config for port 1 and an outdated config for port 2.
+            mock_mqtt_messages: AsyncMock = AsyncMock()
+            mock_mqtt_messages.__aenter__.return_value = MockMQTTMessages(
+                [
+                    ("homeassistant/switch/mocked_unifi/mocked_id-port-2/config", b"""{"name": "OUTDATED"}"""),
+                    (topic, json.dumps(message).encode()),
+                ]
+            )
+            mock_mqtt_client.filtered_messages.return_value = mock_mqtt_messages
 
-        responses.add(mock_list_all_devices_response_1)
+            await plugin._hass.publish()
+
+            mock_mqtt_client.subscribe.assert_awaited_once_with("homeassistant/switch/mocked_unifi/+/config")
+            mock_mqtt_client.unsubscribe.assert_awaited_once_with("homeassistant/switch/mocked_unifi/+/config")
+
+            published: list = [call.args[0] for call in mock_mqtt_client.publish.await_args_list]
+
+            assert topic not in published
+            assert "homeassistant/switch/mocked_unifi/mocked_id-port-2/config" in published
+
+            logs: list = [record.getMessage() for record in caplog.records]
+
+            assert any(log.endswith("(1 unchanged).") for log in logs)
+
+            # A second discovery publishes nothing.
+            mock_mqtt_client.publish.reset_mock()
+            await plugin._hass.publish()
+
+            assert 0 == mock_mqtt_client.publish.await_count
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_discovery_message(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(devices_json_response_2))
 
         unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-        unifi_devices.read_devices()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(unifi_devices.read_devices())
 
         mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
         plugin: HassSwitchesMqttPlugin = HassSwitchesMqttPlugin(
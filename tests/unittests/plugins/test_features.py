@@ -2,22 +2,26 @@ import asyncio
 import json
 from asyncio import Task
 from contextlib import AsyncExitStack
+from typing import List
 from typing import NamedTuple
 from typing import Set
 from unittest.mock import AsyncMock
 from unittest.mock import PropertyMock
+from unittest.mock import patch
 
+import httpx
 import pytest
-import responses
+import respx
 from _pytest.logging import LogCaptureFixture
 from asyncio_mqtt import Client
-from responses import matchers
-from responses.registries import OrderedRegistry
 
 from conftest_data import CONFIG_CONTENT
+from unifi_tools.features import FeaturePort
 from unifi_tools.plugins.features import FeaturesMqttPlugin
 from unifi_tools.unifi import UniFiAPI
+from unifi_tools.unifi import UniFiDevice
 from unifi_tools.unifi import UniFiDevices
+from unifi_tools.unifi import UniFiSwitch
 from unittests.plugins.test_features_data import devices_json_response_1
 from unittests.plugins.test_features_data import devices_json_response_2
 from unittests.plugins.test_features_data import port_overrides_payload
@@ -26,6 +30,7 @@ from unittests.test_unifi_api_data import RESPONSE_HEADER
 
 
 class MockMQTTMessage(NamedTuple):
+    topic: str
     payload: bytes
 
 
@@ -38,51 +43,71 @@ class MockMQTTMessages:
 
     async def __anext__(self):
         if self.message:
-            return MockMQTTMessage(self.message.pop())
+            return MockMQTTMessage(*self.message.pop())
 
         raise StopAsyncIteration
 
 
 class TestHappyPathFeaturesMqttPlugin(TestUniFiApi):
-    @responses.activate(registry=OrderedRegistry)
+    @respx.mock
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
     def test_init_tasks(self, config_loader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
         async def run():
-            mock_list_all_devices_response_1 = responses.get(
-                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
-                json=json.loads(devices_json_response_2),
-                match=[matchers.header_matcher(RESPONSE_HEADER)],
+            # Startup read, first poll and the poll triggered by the command.
+            mock_list_all_devices_response = respx.get(
+                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+                headers=RESPONSE_HEADER,
+            ).mock(
+                side_effect=[
+                    httpx.Response(httpx.codes.OK, json=json.loads(devices_json_response_1)),
+                    httpx.Response(httpx.codes.OK, json=json.loads(devices_json_response_1)),
+                    httpx.Response(httpx.codes.OK, json=json.loads(devices_json_response_2)),
+                ]
             )
 
-            mock_list_all_devices_response_2 = responses.get(
-                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
-                json=json.loads(devices_json_response_1),
-                match=[matchers.header_matcher(RESPONSE_HEADER)],
-            )
-
-            mock_update_device_response = responses.put(
-                url=f"{unifi_api.controller_url}{UniFiAPI.REST_DEVICE_ENDPOINT}/MOCKED_DEVICE_ID",
-                json=json.loads(devices_json_response_2),
-                match=[
-                    matchers.header_matcher(RESPONSE_HEADER),
-                    matchers.json_params_matcher(json.loads(port_overrides_payload)),
-                ],
-            )
+            # The PoE command is based on the cached port overrides.
+            mock_update_device_response = respx.put(
+                url=f"{unifi_api.controller_url}{UniFiAPI.REST_DEVICE_ENDPOINT.format(site='default')}/MOCKED_DEVICE_ID",
+                headers=RESPONSE_HEADER,
+                json=json.loads(port_overrides_payload),
+            ).respond(json=json.loads(devices_json_response_2))
 
-            responses.add(mock_list_all_devices_response_1)
-            responses.add(mock_list_all_devices_response_2)
-            responses.add(mock_update_device_response)
+            mock_get_device_response = respx.get(
+                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}/b4:fb:e4:b6:6f:12",
+                headers=RESPONSE_HEADER,
+            ).respond(json=json.loads(devices_json_response_2))
 
             unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-            unifi_devices.read_devices()
+            await unifi_devices.read_devices()
 
             mock_mqtt_messages: AsyncMock = AsyncMock()
-            mock_mqtt_messages.__aenter__.return_value = MockMQTTMessages([b"""{"poe_mode": "on"}"""])
+            mock_mqtt_messages.__aenter__.return_value = MockMQTTMessages(
+                [
+                    ("mocked_unifi/unknown-port-1/set", b"""{"poe_mode": "off"}"""),
+                    ("mocked_unifi/mocked_id-port-1/set", b"""{"poe_mode": "on"}"""),
+                ]
+            )
+
+            # The broker holds the unchanged state of port 2 and an outdated state of port 3.
+            mock_mqtt_retained: AsyncMock = AsyncMock()
+            mock_mqtt_retained.__aenter__.return_value = MockMQTTMessages(
+                [
+                    ("mocked_unifi/mocked_id-port-3/get", b"""{"poe_mode": "auto"}"""),
+                    ("mocked_unifi/mocked_id-port-2/get", b"""{"poe_mode": "off"}"""),
+                ]
+            )
 
             mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
-            mock_mqtt_client.filtered_messages.return_value = mock_mqtt_messages
+            mock_mqtt_client.filtered_messages.side_effect = lambda topic: {
+                "mocked_unifi/+/set": mock_mqtt_messages,
+                "mocked_unifi/+/get": mock_mqtt_retained,
+            }[topic]
+
+            # Only the PoE command triggers the second poll.
+            unifi_devices.config.unifi_controller.poll_min_interval = 60
+            unifi_devices.config.unifi_controller.poll_max_interval = 60
 
-            FeaturesMqttPlugin.PUBLISH_RUNNING = PropertyMock(side_effect=[True, False])
+            FeaturesMqttPlugin.PUBLISH_RUNNING = PropertyMock(side_effect=[True, True, False])
             plugin = FeaturesMqttPlugin(unifi_devices=unifi_devices, mqtt_client=mock_mqtt_client)
 
             async with AsyncExitStack() as stack:
@@ -102,20 +127,169 @@ class TestHappyPathFeaturesMqttPlugin(TestUniFiApi):
 
             assert "[API] Reading adopted devices." in logs
 
-            assert "[MQTT] Subscribe topic mocked_unifi/mocked_id-port-1/set" in logs
-            assert "[MQTT] Subscribe topic mocked_unifi/mocked_id-port-2/set" in logs
-            assert "[MQTT] Subscribe topic mocked_unifi/mocked_id-port-3/set" in logs
+            assert "[MQTT] Subscribe topic mocked_unifi/+/set" in logs
 
-            assert "[API] [ok] https://unifi.local/api/s/default/stat/device" in logs
             assert "[API] [ok] https://unifi.local/api/s/default/rest/device/MOCKED_DEVICE_ID" in logs
             assert "[API] [update_device] MOCKED_DEVICE_ID" in logs
 
             assert '[MQTT] [mocked_unifi/mocked_id-port-1/set] Subscribe message: {"poe_mode": "on"}' in logs
+            # The first poll publishes the state before the command and the triggered poll the state after it.
+            assert '[MQTT] [mocked_unifi/mocked_id-port-1/get] Publishing message: {"poe_mode": "off"}' in logs
             assert '[MQTT] [mocked_unifi/mocked_id-port-1/get] Publishing message: {"poe_mode": "auto"}' in logs
-            assert '[MQTT] [mocked_unifi/mocked_id-port-2/get] Publishing message: {"poe_mode": "off"}' in logs
+            assert '[MQTT] [mocked_unifi/mocked_id-port-2/get] Publishing message: {"poe_mode": "off"}' not in logs
             assert '[MQTT] [mocked_unifi/mocked_id-port-3/get] Publishing message: {"poe_mode": "off"}' in logs
 
-            assert 12 == len(logs)
+            assert 10 == len(logs)
+
+            assert "[MQTT] Seeded 1 unchanged states from retained messages." in logs
+
+            mock_mqtt_client.subscribe.assert_any_await("mocked_unifi/+/set")
+            mock_mqtt_client.subscribe.assert_any_await("mocked_unifi/+/get")
+            mock_mqtt_client.unsubscribe.assert_awaited_once_with("mocked_unifi/+/get")
+
+            assert 3 == mock_list_all_devices_response.call_count
+            assert 1 == mock_update_device_response.call_count
+            assert 1 == mock_get_device_response.call_count
+
+            # The controller requests arrive in this order: startup read, first poll, PoE command,
+            # read back of the commanded switch and the poll triggered by the command.
+            assert [
+                ("GET", "/api/s/default/stat/device"),
+                ("GET", "/api/s/default/stat/device"),
+                ("PUT", "/api/s/default/rest/device/MOCKED_DEVICE_ID"),
+                ("GET", "/api/s/default/stat/device/b4:fb:e4:b6:6f:12"),
+                ("GET", "/api/s/default/stat/device"),
+            ] == [(call.request.method, call.request.url.path) for call in respx.calls]
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_subscribe_controllers(self, config_loader, unifi_api: UniFiAPI):
+        async def run():
+            plugins: List[FeaturesMqttPlugin] = []
+            mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
+
+            # Two controllers with different switches share the MQTT client and the command topic filter.
+            for device_id in ["MOCKED_DEVICE_ID", "SECOND_DEVICE_ID"]:
+                device_infos: List[dict] = json.loads(devices_json_response_1)["data"]
+                device_infos[0]["_id"] = device_id
+
+                unifi_devices: UniFiDevices = UniFiDevices(unifi_api=UniFiAPI(config=unifi_api.config))
+                unifi_devices.unifi_device_map.initialise(device_infos)
+
+                UniFiSwitch(
+                    unifi_devices=unifi_devices,
+                    unifi_device=UniFiDevice(id=device_id, info=unifi_devices.unifi_device_map[device_id]),
+                ).parse_features()
+
+                plugin = FeaturesMqttPlugin(unifi_devices=unifi_devices, mqtt_client=mock_mqtt_client)
+                plugin._set_state = AsyncMock()
+                plugins.append(plugin)
+
+            mock_mqtt_messages: AsyncMock = AsyncMock()
+            mock_mqtt_messages.__aenter__.return_value = MockMQTTMessages(
+                [("mocked_unifi/mocked_id-port-1/set", b"""{"poe_mode": "on"}""")]
+            )
+            mock_mqtt_client.filtered_messages.return_value = mock_mqtt_messages
+
+            async with AsyncExitStack() as stack:
+                tasks: Set[Task] = await FeaturesMqttPlugin.init_subscribe_tasks(stack, mock_mqtt_client, plugins)
+                await asyncio.gather(*tasks)
+
+            mock_mqtt_client.filtered_messages.assert_called_once_with("mocked_unifi/+/set")
+            mock_mqtt_client.subscribe.assert_awaited_once_with("mocked_unifi/+/set")
+
+            # The command reaches the plugin of the first controller.
+            plugins[0]._set_state.assert_awaited_once_with(
+                plugins[0].topics["mocked_unifi/mocked_id-port-1/set"],
+                "mocked_unifi/mocked_id-port-1/set",
+                """{"poe_mode": "on"}""",
+            )
+            plugins[1]._set_state.assert_not_awaited()
+
+            assert "mocked_unifi/second_device_id-port-1/set" in plugins[1].topics
+
+            for plugin in plugins:
+                plugin.unifi_devices.unifi_api.shutdown()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_subscribe_set_state_failed(self, config_loader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        async def run():
+            mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
+
+            unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+            unifi_devices.unifi_device_map.initialise(json.loads(devices_json_response_1)["data"])
+
+            UniFiSwitch(
+                unifi_devices=unifi_devices,
+                unifi_device=UniFiDevice(
+                    id="MOCKED_DEVICE_ID", info=unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]
+                ),
+            ).parse_features()
+
+            plugin = FeaturesMqttPlugin(unifi_devices=unifi_devices, mqtt_client=mock_mqtt_client)
+
+            mock_mqtt_messages: AsyncMock = AsyncMock()
+            mock_mqtt_messages.__aenter__.return_value = MockMQTTMessages(
+                [("mocked_unifi/mocked_id-port-1/set", b"""{"poe_mode": "on"}""")]
+            )
+            mock_mqtt_client.filtered_messages.return_value = mock_mqtt_messages
+
+            # The failed command is logged and does not end the subscribe task.
+            with patch.object(FeaturePort, "set_state", side_effect=RuntimeError("MOCKED ERROR")) as mock_set_state:
+                async with AsyncExitStack() as stack:
+                    tasks: Set[Task] = await FeaturesMqttPlugin.init_subscribe_tasks(stack, mock_mqtt_client, [plugin])
+                    await asyncio.gather(*tasks)
+
+            mock_set_state.assert_awaited_once_with({"poe_mode": "on"})
+
+            logs: list = [record.getMessage() for record in caplog.records]
+
+            assert "[MQTT] [mocked_unifi/mocked_id-port-1/set] Subscribe message failed: MOCKED ERROR" in logs
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_publish_devices(self, config_loader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        async def run():
+            respx.get(
+                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+                headers=RESPONSE_HEADER,
+            ).respond(json=json.loads(devices_json_response_2))
+
+            unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+            await unifi_devices.read_devices()
+
+            mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
+            plugin = FeaturesMqttPlugin(unifi_devices=unifi_devices, mqtt_client=mock_mqtt_client)
+            plugin.devices = plugin._get_devices()
+
+            assert ["mocked_unifi/mocked_id/state"] == list(plugin.devices)
+
+            # Every device state is published once.
+            await plugin._publish_devices(set())
+            await plugin._publish_devices(set())
+
+            mock_mqtt_client.publish.assert_awaited_once()
+            topic, payload = mock_mqtt_client.publish.await_args.args
+            state: dict = json.loads(payload)
+
+            assert "mocked_unifi/mocked_id/state" == topic
+            assert len(plugin.devices[topic]) == len(state)
+            assert {"poe_mode": "auto"} == state["port-1"]
+
+            # A changed port publishes the device state again.
+            unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]["ports"].set(1, name="MOCKED Port 1", poe_mode="off")
+            await plugin._publish_devices({"mocked_id"})
+
+            assert 2 == mock_mqtt_client.publish.await_count
+            assert {"poe_mode": "off"} == json.loads(mock_mqtt_client.publish.await_args.args[1])["port-1"]
 
         loop = asyncio.new_event_loop()
         loop.run_until_complete(run())
@@ -10,7 +10,7 @@ devices_json_response_1: str = """{
             "anon_id": "ef1c5fdb-7f24-4806-88d9-76db276a9b01",
             "architecture": "armv7l",
             "board_rev": 8,
-            "cfgversion": "9b584e5b55742366",
+            "cfgversion": "4f0b6d2a91c3e587",
             "config_network": {
                 "type": "dhcp"
             },
@@ -127,7 +127,7 @@ devices_json_response_1: str = """{
             "upgradable": false,
             "adoptable_when_upgraded": false,
             "rollupgrade": false,
-            "known_cfgversion": "9b584e5b55742366",
+            "known_cfgversion": "4f0b6d2a91c3e587",
             "uptime": 9221294,
             "_uptime": 9221294,
             "locating": false,
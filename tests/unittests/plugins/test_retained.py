@@ -0,0 +1,42 @@
+import asyncio
+from typing import Dict
+from unittest.mock import AsyncMock
+
+from asyncio_mqtt import Client
+
+from unifi_tools.plugins.retained import read_retained
+from unittests.plugins.test_features import MockMQTTMessages
+
+
+class TestHappyPathReadRetained:
+    def test_read_retained_shared(self):
+        async def run():
+            mock_mqtt_retained: AsyncMock = AsyncMock()
+            mock_mqtt_retained.__aenter__.return_value = MockMQTTMessages(
+                [
+                    ("mocked_unifi/mocked_id-port-2/get", b""),
+                    ("mocked_unifi/mocked_id-port-1/get", b"""{"poe_mode": "auto"}"""),
+                ]
+            )
+
+            mock_mqtt_client: AsyncMock = AsyncMock(spec=Client)
+            mock_mqtt_client.filtered_messages.return_value = mock_mqtt_retained
+
+            # E.g. the plugins of two UniFi controllers read the same topic filter at the same time.
+            retained_1, retained_2 = await asyncio.gather(
+                read_retained(mock_mqtt_client, "mocked_unifi/+/get"),
+                read_retained(mock_mqtt_client, "mocked_unifi/+/get"),
+            )
+
+            mock_mqtt_client.filtered_messages.assert_called_once_with("mocked_unifi/+/get")
+            mock_mqtt_client.subscribe.assert_awaited_once_with("mocked_unifi/+/get")
+            mock_mqtt_client.unsubscribe.assert_awaited_once_with("mocked_unifi/+/get")
+
+            expected: Dict[str, bytes] = {"mocked_unifi/mocked_id-port-1/get": b"""{"poe_mode": "auto"}"""}
+
+            assert expected == retained_1
+            assert expected == retained_2
+            assert retained_1 is not retained_2
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
@@ -1,12 +1,61 @@
+from typing import List
+
 import pytest
 
 from conftest import ConfigLoader
+from conftest_data import CONFIG_CONTENT
+from unifi_tools.config import Config
 from unifi_tools.config import ConfigException
+from unittests.test_config_data import CONFIG_CONTROLLERS
+from unittests.test_config_data import CONFIG_INVALID_CACHE_MAX_AGE
+from unittests.test_config_data import CONFIG_INVALID_COMMAND_WINDOW
+from unittests.test_config_data import CONFIG_INVALID_CONTROLLER_PROPERTY
 from unittests.test_config_data import CONFIG_INVALID_DEVICE_NAME
+from unittests.test_config_data import CONFIG_INVALID_FEATURE_POE_MODE
+from unittests.test_config_data import CONFIG_INVALID_FEATURE_PORT
 from unittests.test_config_data import CONFIG_INVALID_FEATURE_PROPERTY
 from unittests.test_config_data import CONFIG_INVALID_FEATURE_TYPE
 from unittests.test_config_data import CONFIG_INVALID_HOMEASSISTANT_DISCOVERY_PREFIX
+from unittests.test_config_data import CONFIG_INVALID_HOMEASSISTANT_DISCOVERY_QOS
 from unittests.test_config_data import CONFIG_INVALID_LOG_LEVEL
+from unittests.test_config_data import CONFIG_INVALID_MAX_WORKERS
+from unittests.test_config_data import CONFIG_INVALID_POLL_INTERVAL
+from unittests.test_config_data import CONFIG_INVALID_SESSION_RENEW_MARGIN
+from unittests.test_config_data import CONFIG_INVALID_SITES
+
+
+class TestHappyPathConfig:
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_port_poe_modes(self, config_loader: ConfigLoader):
+        config = config_loader.get_config()
+
+        assert {("MOCKED_DEVICE_ID", 3): "pasv24"} == config.port_poe_modes
+
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_controller_configs(self, config_loader: ConfigLoader):
+        config = config_loader.get_config()
+
+        assert [config] == config.get_controller_configs()
+
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTROLLERS], indirect=True)
+    def test_multiple_controller_configs(self, config_loader: ConfigLoader):
+        config = config_loader.get_config()
+        controller_configs: List[Config] = config.get_controller_configs()
+
+        assert 2 == len(controller_configs)
+
+        assert "controller1.local" == controller_configs[0].unifi_controller.url
+        assert "user1" == controller_configs[0].unifi_controller.username
+        assert 8443 == controller_configs[0].unifi_controller.port
+        assert ["default"] == controller_configs[0].unifi_controller.sites
+
+        assert "controller2.local" == controller_configs[1].unifi_controller.url
+        assert 443 == controller_configs[1].unifi_controller.port
+        assert ["default", "site2"] == controller_configs[1].unifi_controller.sites
+
+        # Everything except the controller is shared.
+        assert config.mqtt is controller_configs[1].mqtt
+        assert config.features is controller_configs[1].features
 
 
 class TestUnhappyPathConfig:
@@ -21,6 +70,10 @@ class TestUnhappyPathConfig:
                 CONFIG_INVALID_HOMEASSISTANT_DISCOVERY_PREFIX,
                 "[HOMEASSISTANT] Invalid value 'invalid discovery name' in 'discovery_prefix'. The following characters are prohibited: a-z 0-9 -_",
             ),
+            (
+                CONFIG_INVALID_HOMEASSISTANT_DISCOVERY_QOS,
+                "[HOMEASSISTANT] Invalid value '3' in 'discovery_qos'. The value must be 0, 1 or 2.",
+            ),
             (
                 CONFIG_INVALID_FEATURE_TYPE,
                 "Expected features to be <class 'dict'>, got 'INVALID'",
@@ -29,6 +82,42 @@ class TestUnhappyPathConfig:
                 CONFIG_INVALID_FEATURE_PROPERTY,
                 "Invalid feature property: {'invalid_property': 'INVALID'}",
             ),
+            (
+                CONFIG_INVALID_FEATURE_PORT,
+                "Invalid port in 'ports': {'poe_mode': 'auto'}",
+            ),
+            (
+                CONFIG_INVALID_FEATURE_POE_MODE,
+                "Invalid value 'on' in 'poe_mode'. The following PoE modes are allowed: auto pasv24.",
+            ),
+            (
+                CONFIG_INVALID_MAX_WORKERS,
+                "Invalid value '0' in 'max_workers'. The value must be greater than 0.",
+            ),
+            (
+                CONFIG_INVALID_POLL_INTERVAL,
+                "Invalid value '0.5' in 'poll_max_interval'. The value must be greater than or equal to 'poll_min_interval'.",
+            ),
+            (
+                CONFIG_INVALID_CACHE_MAX_AGE,
+                "Invalid value '-1' in 'cache_max_age'. The value must be greater than or equal to 0.",
+            ),
+            (
+                CONFIG_INVALID_COMMAND_WINDOW,
+                "Invalid value '-0.1' in 'command_window'. The value must be greater than or equal to 0.",
+            ),
+            (
+                CONFIG_INVALID_SITES,
+                "Invalid value '[]' in 'sites'. At least one site is required.",
+            ),
+            (
+                CONFIG_INVALID_CONTROLLER_PROPERTY,
+                "Invalid controller property: {'url': 'controller1.local', 'invalid_property': 'INVALID'}",
+            ),
+            (
+                CONFIG_INVALID_SESSION_RENEW_MARGIN,
+                "Invalid value '60' in 'session_renew_margin'. The value must be less than 'session_ttl'.",
+            ),
             (
                 CONFIG_INVALID_LOG_LEVEL,
                 "Invalid log level 'invalid'. The following log levels are allowed: error warning info debug.",
@@ -1,5 +1,21 @@
 from typing import Final
 
+CONFIG_CONTROLLERS: Final[
+    str
+] = """device_info:
+  name: MOCKED_UNIFI
+unifi_controllers:
+  - url: controller1.local
+    username: user1
+  - url: controller2.local
+    port: 443
+    sites:
+      - default
+      - site2
+logging:
+  level: debug
+"""
+
 CONFIG_INVALID_DEVICE_NAME: Final[
     str
 ] = """device_info:
@@ -19,6 +35,18 @@ logging:
   level: debug
 """
 
+CONFIG_INVALID_HOMEASSISTANT_DISCOVERY_QOS: Final[
+    str
+] = """device_info:
+  name: MOCKED_UNIFI
+homeassistant:
+  enabled: true
+  discovery_qos: 3
+  discovery_window: 4
+logging:
+  level: debug
+"""
+
 CONFIG_INVALID_FEATURE_TYPE: Final[
     str
 ] = """device_info:
@@ -39,6 +67,104 @@ logging:
   level: debug
 """
 
+CONFIG_INVALID_FEATURE_PORT: Final[
+    str
+] = """device_info:
+  name: MOCKED_DEVICE
+features:
+  MOCKED_DEVICE_ID:
+    ports:
+      - poe_mode: auto
+logging:
+  level: debug
+"""
+
+CONFIG_INVALID_FEATURE_POE_MODE: Final[
+    str
+] = """device_info:
+  name: MOCKED_DEVICE
+features:
+  MOCKED_DEVICE_ID:
+    ports:
+      - port_idx: 1
+        poe_mode: "on"
+logging:
+  level: debug
+"""
+
+CONFIG_INVALID_MAX_WORKERS: Final[
+    str
+] = """device_info:
+  name: MOCKED_DEVICE
+unifi_controller:
+  max_workers: 0
+logging:
+  level: debug
+"""
+
+CONFIG_INVALID_POLL_INTERVAL: Final[
+    str
+] = """device_info:
+  name: MOCKED_DEVICE
+unifi_controller:
+  poll_min_interval: 1.0
+  poll_max_interval: 0.5
+logging:
+  level: debug
+"""
+
+CONFIG_INVALID_CACHE_MAX_AGE: Final[
+    str
+] = """device_info:
+  name: MOCKED_DEVICE
+unifi_controller:
+  cache_max_age: -1
+logging:
+  level: debug
+"""
+
+CONFIG_INVALID_COMMAND_WINDOW: Final[
+    str
+] = """device_info:
+  name: MOCKED_DEVICE
+unifi_controller:
+  command_window: -0.1
+logging:
+  level: debug
+"""
+
+CONFIG_INVALID_SITES: Final[
+    str
+] = """device_info:
+  name: MOCKED_DEVICE
+unifi_controller:
+  sites: []
+logging:
+  level: debug
+"""
+
+CONFIG_INVALID_CONTROLLER_PROPERTY: Final[
+    str
+] = """device_info:
+  name: MOCKED_UNIFI
+unifi_controllers:
+  - url: controller1.local
+    invalid_property: INVALID
+logging:
+  level: debug
+"""
+
+CONFIG_INVALID_SESSION_RENEW_MARGIN: Final[
+    str
+] = """device_info:
+  name: MOCKED_DEVICE
+unifi_controller:
+  session_ttl: 60
+  session_renew_margin: 60
+logging:
+  level: debug
+"""
+
 CONFIG_INVALID_LOG_LEVEL: Final[
     str
 ] = """device_info:
@@ -1,8 +1,8 @@
+import asyncio
 import json
 
 import pytest
-import responses
-from responses import matchers
+import respx
 
 from conftest import ConfigLoader
 from conftest_data import CONFIG_CONTENT
@@ -19,18 +19,13 @@ from unittests.test_unifi_api_data import UPDATED_PORT_OVERRIDES_WITH_CUSTOM_FEA
 
 
 class TestHappyPathFeatures(TestUniFiApi):
-    @responses.activate
     @pytest.fixture(autouse=True)
-    def setup(self, unifi_api: UniFiAPI):
-        mock_response = responses.get(
-            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
-            json=json.loads(DEVICES_JSON_RESPONSE),
-            match=[matchers.header_matcher(RESPONSE_HEADER)],
-        )
-
-        responses.add(mock_response)
+    def setup(self, unifi_api: UniFiAPI, respx_mock: respx.MockRouter):
+        respx_mock.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(DEVICES_JSON_RESPONSE))
 
-    @responses.activate
     @pytest.mark.parametrize(
         "port_idx, expected",
         [
@@ -70,8 +65,10 @@ class TestHappyPathFeatures(TestUniFiApi):
     def test_feature_port_properties(
         self, config_loader: ConfigLoader, unifi_api: UniFiAPI, port_idx: int, expected: dict
     ):
+        loop = asyncio.new_event_loop()
+
         unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-        unifi_devices.scan()
+        loop.run_until_complete(unifi_devices.scan())
 
         device = unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]
 
@@ -90,8 +87,43 @@ class TestHappyPathFeatures(TestUniFiApi):
         assert expected["topic"] == feature.topic
         assert expected["json_attributes"] == feature.json_attributes
         assert expected["changed"] is feature.changed
+        assert False is feature.changed
+        assert expected["json_attributes"] == feature.state.json_attributes
+        assert expected["json_attributes"].encode() == feature.state.payload
+
+        # The identity fields are computed once and only change with update_identity().
+        unifi_devices.config.features.clear()
+        assert expected["topic"] == feature.topic
+
+        feature.update_identity()
+        assert f"mocked_unifi/mocked_device_id-port-{port_idx}" == feature.topic
+        assert f"mocked_unifi-mocked_device_id-port-{port_idx}" == feature.object_id
+
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_feature_port_changed(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
+        loop = asyncio.new_event_loop()
+
+        unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+        loop.run_until_complete(unifi_devices.scan())
+
+        device = unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]
+
+        feature = FeaturePort(
+            unifi_devices=unifi_devices,
+            unifi_device=UniFiDevice(id="MOCKED_DEVICE_ID", info=device),
+            port_info=device["ports"][1],
+        )
+
+        assert True is feature.changed
+        assert False is feature.changed
+
+        # "pasv24" and "auto" have the same value, but the published attributes differ.
+        device["ports"][1] = device["ports"][1]._replace(poe_mode="auto")
+
+        assert {"poe_mode": "on"} == feature.value
+        assert True is feature.changed
+        assert '{"poe_mode": "auto"}' == feature.state.json_attributes
 
-    @responses.activate
     @pytest.mark.parametrize(
         "port_idx, poe_mode, payload, expected",
         [
@@ -110,19 +142,21 @@ class TestHappyPathFeatures(TestUniFiApi):
         payload: str,
         expected: bool,
     ):
-        mock_response = responses.put(
-            url=f"{unifi_api.controller_url}{UniFiAPI.REST_DEVICE_ENDPOINT}/MOCKED_DEVICE_ID",
-            json=json.loads(DEVICES_JSON_RESPONSE),
-            match=[
-                matchers.header_matcher(RESPONSE_HEADER),
-                matchers.json_params_matcher(json.loads(payload)),
-            ],
-        )
+        respx.put(
+            url=f"{unifi_api.controller_url}{UniFiAPI.REST_DEVICE_ENDPOINT.format(site='default')}/MOCKED_DEVICE_ID",
+            headers=RESPONSE_HEADER,
+            json=json.loads(payload),
+        ).respond(json=json.loads(DEVICES_JSON_RESPONSE))
+
+        respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}/b4:fb:e4:b6:6f:12",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(DEVICES_JSON_RESPONSE))
 
-        responses.add(mock_response)
+        loop = asyncio.new_event_loop()
 
         unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-        unifi_devices.scan()
+        loop.run_until_complete(unifi_devices.scan())
 
         device = unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]
 
@@ -132,6 +166,6 @@ class TestHappyPathFeatures(TestUniFiApi):
             port_info=device["ports"][port_idx],
         )
 
-        update_devices: bool = feature.set_state(value={"poe_mode": poe_mode})
+        update_devices: bool = loop.run_until_complete(feature.set_state(value={"poe_mode": poe_mode}))
 
         assert expected is update_devices
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+
+from _pytest.logging import LogCaptureFixture
+
+from unifi_tools.logging import LOG_NAME
+from unifi_tools.scheduler import PollScheduler
+
+
+class TestHappyPathPollScheduler:
+    def test_backoff(self):
+        scheduler: PollScheduler = PollScheduler(min_interval=1, max_interval=5)
+
+        for expected in [2, 4, 5, 5]:
+            scheduler.start()
+            scheduler.finish(changed=False)
+
+            assert expected == scheduler.interval
+            assert expected == scheduler.stats.interval
+
+        scheduler.start()
+        scheduler.finish(changed=True)
+
+        assert 1 == scheduler.interval
+
+    def test_trigger(self):
+        async def run():
+            scheduler: PollScheduler = PollScheduler(min_interval=1, max_interval=60)
+
+            for _ in range(3):
+                scheduler.start()
+                scheduler.finish(changed=False)
+
+            assert 8 == scheduler.interval
+
+            scheduler.trigger()
+
+            started: float = time.monotonic()
+            await scheduler.wait()
+
+            assert 1 > time.monotonic() - started
+            assert 1 == scheduler.interval
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+    def test_trigger_while_in_flight(self):
+        async def run():
+            scheduler: PollScheduler = PollScheduler(min_interval=1, max_interval=60)
+            scheduler.start()
+
+            assert True is scheduler.in_flight
+
+            scheduler.trigger()
+            scheduler.finish(changed=False)
+
+            assert False is scheduler.in_flight
+            assert 1 == scheduler.interval
+
+            started: float = time.monotonic()
+            await scheduler.wait()
+
+            assert 1 > time.monotonic() - started
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+    def test_stats(self):
+        async def run():
+            scheduler: PollScheduler = PollScheduler(min_interval=0.01, max_interval=0.01)
+
+            await scheduler.wait()
+            scheduler.start()
+            await asyncio.sleep(0.02)
+            scheduler.finish(changed=False)
+
+            assert 0.02 <= scheduler.stats.duration
+            assert 0 <= scheduler.stats.skew
+            assert 1 == scheduler.stats.polls
+            assert scheduler.stats.duration == scheduler.stats.max_duration
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+    def test_log(self, caplog: LogCaptureFixture):
+        # The summary is logged at debug level.
+        caplog.set_level(logging.DEBUG, logger=LOG_NAME)
+        scheduler: PollScheduler = PollScheduler(min_interval=0.01, max_interval=0.01)
+
+        for _ in range(40):
+            scheduler.start()
+            scheduler.finish(changed=False)
+
+        # Fast polls are not logged until the summary is due.
+        assert 0 == len(caplog.records)
+        assert 40 == scheduler.stats.polls
+
+        scheduler.SLOW_POLL = 0
+        scheduler.start()
+        scheduler.finish(changed=False)
+
+        scheduler.LOG_INTERVAL = 0
+        scheduler.start()
+        scheduler.finish(changed=False)
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert 3 == len(logs)
+        assert logs[0].startswith("[API] Poll took")
+        assert logs[2].startswith("[API] 42 polls in")
+        assert 0 == scheduler.stats.polls
@@ -1,8 +1,16 @@
+import asyncio
 import json
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
 
+import httpx
 import pytest
 import requests
 import responses
+import respx
 from _pytest.logging import LogCaptureFixture
 from requests import Response
 from responses import matchers
@@ -115,7 +123,7 @@ class TestHappyPathUniFiApi(TestUniFiApi):
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
     def test_list_all_devices(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
         mock_response = responses.get(
-            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
             json=json.loads(DEVICES_JSON_RESPONSE),
             match=[matchers.header_matcher(RESPONSE_HEADER)],
         )
@@ -135,11 +143,121 @@ class TestHappyPathUniFiApi(TestUniFiApi):
         assert requests.codes.ok == response.status_code
         assert 1 == mock_response.call_count
 
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_async_list_all_devices(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        mock_response = respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(DEVICES_JSON_RESPONSE))
+
+        loop = asyncio.new_event_loop()
+        result, response = loop.run_until_complete(unifi_api.async_list_all_devices(log=False))
+        loop.run_until_complete(unifi_api.async_close())
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert 0 == len(logs)
+
+        assert isinstance(result, UniFiAPIResult)
+        assert isinstance(response, httpx.Response)
+
+        assert "ok" == result.meta["rc"]
+        assert httpx.codes.OK == response.status_code
+        assert 1 == mock_response.call_count
+
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_async_update_device(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        mock_response = respx.put(
+            url=f"{unifi_api.controller_url}{UniFiAPI.REST_DEVICE_ENDPOINT.format(site='default')}/MOCKED_DEVICE_ID",
+            headers=RESPONSE_HEADER,
+            json=json.loads(PORT_OVERRIDES_PAYLOAD),
+        ).respond(json=json.loads(DEVICES_JSON_RESPONSE))
+
+        loop = asyncio.new_event_loop()
+        result, response = loop.run_until_complete(
+            unifi_api.async_update_device(
+                device_id="MOCKED_DEVICE_ID", port_overrides=json.loads(PORT_OVERRIDES_PAYLOAD)
+            )
+        )
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert "[API] [ok] https://unifi.local/api/s/default/rest/device/MOCKED_DEVICE_ID" in logs
+        assert "[API] [update_device] MOCKED_DEVICE_ID" in logs
+        assert 2 == len(logs)
+
+        assert isinstance(result, UniFiAPIResult)
+        assert isinstance(response, httpx.Response)
+
+        assert "ok" == result.meta["rc"]
+        assert 1 == mock_response.call_count
+
+    @responses.activate
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_async_client_shares_cookies(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
+        mock_login_response = responses.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            json={
+                "meta": {"rc": "ok"},
+                "data": [],
+            },
+            headers={"Set-Cookie": "unifises=MOCKED_SESSION; Path=/"},
+        )
+
+        mock_list_all_devices_response = respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            cookies={"unifises": "MOCKED_SESSION"},
+        ).respond(json=json.loads(DEVICES_JSON_RESPONSE))
+
+        # The session of the startup login is used by the async client.
+        unifi_api.login()
+
+        loop = asyncio.new_event_loop()
+        result, response = loop.run_until_complete(unifi_api.async_list_all_devices())
+
+        assert isinstance(result, UniFiAPIResult)
+        assert "ok" == result.meta["rc"]
+        assert 1 == mock_login_response.call_count
+        assert 1 == mock_list_all_devices_response.call_count
+
+    @responses.activate
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_executor_session_shares_cookies(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
+        unifi_api.config.unifi_controller.thread_pool = True
+
+        mock_login_response = responses.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            json={
+                "meta": {"rc": "ok"},
+                "data": [],
+            },
+            headers={"Set-Cookie": "unifises=MOCKED_SESSION; Path=/"},
+        )
+
+        mock_list_all_devices_response = responses.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            json=json.loads(DEVICES_JSON_RESPONSE),
+            match=[matchers.header_matcher({"Cookie": "unifises=MOCKED_SESSION"})],
+        )
+
+        unifi_api.login()
+
+        loop = asyncio.new_event_loop()
+        result, response = loop.run_until_complete(unifi_api.async_list_all_devices())
+
+        assert isinstance(result, UniFiAPIResult)
+        assert "ok" == result.meta["rc"]
+        assert 1 == mock_login_response.call_count
+        assert 1 == mock_list_all_devices_response.call_count
+
     @responses.activate
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
     def test_update_device(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
         mock_response = responses.put(
-            url=f"{unifi_api.controller_url}{UniFiAPI.REST_DEVICE_ENDPOINT}/MOCKED_DEVICE_ID",
+            url=f"{unifi_api.controller_url}{UniFiAPI.REST_DEVICE_ENDPOINT.format(site='default')}/MOCKED_DEVICE_ID",
             json=json.loads(DEVICES_JSON_RESPONSE),
             match=[
                 matchers.header_matcher(RESPONSE_HEADER),
@@ -170,7 +288,7 @@ class TestHappyPathUniFiApi(TestUniFiApi):
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
     def test_reconnect(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
         mock_list_all_devices_failed_response = responses.get(
-            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
             json={
                 "meta": {
                     "rc": "error",
@@ -192,7 +310,7 @@ class TestHappyPathUniFiApi(TestUniFiApi):
         )
 
         mock_list_all_devices_response = responses.get(
-            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
             json=json.loads(DEVICES_JSON_RESPONSE),
             match=[matchers.header_matcher(RESPONSE_HEADER)],
         )
@@ -221,6 +339,219 @@ class TestHappyPathUniFiApi(TestUniFiApi):
         assert 1 == mock_login_response.call_count
         assert 1 == mock_list_all_devices_response.call_count
 
+        assert 1 == unifi_api.reauth_count
+
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_async_reconnect(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        async def list_all_devices(request: httpx.Request) -> httpx.Response:
+            # Both requests are sent with the expired session before one of them logs in again.
+            await asyncio.sleep(0.01)
+
+            if "unifises=MOCKED_SESSION" in request.headers.get("Cookie", ""):
+                return httpx.Response(httpx.codes.OK, json=json.loads(DEVICES_JSON_RESPONSE))
+
+            return httpx.Response(
+                httpx.codes.UNAUTHORIZED, json={"meta": {"rc": "error", "msg": "api.err.LoginRequired"}, "data": []}
+            )
+
+        mock_list_all_devices_response = respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            headers=RESPONSE_HEADER,
+        ).mock(side_effect=list_all_devices)
+
+        mock_login_response = respx.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            headers=RESPONSE_HEADER,
+        ).respond(json={"meta": {"rc": "ok"}, "data": []}, headers={"Set-Cookie": "unifises=MOCKED_SESSION; Path=/"})
+
+        async def run():
+            # Both requests got a 401 with the same session, only one of them logs in again.
+            return await asyncio.gather(unifi_api.async_list_all_devices(), unifi_api.async_list_all_devices())
+
+        loop = asyncio.new_event_loop()
+        results = loop.run_until_complete(run())
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert 2 == logs.count("[API] [error] api.err.LoginRequired https://unifi.local/api/s/default/stat/device")
+        assert "[API] [ok] https://unifi.local/api/login" in logs
+        assert 1 == logs.count("[API] Successfully logged in.")
+
+        for result, response in results:
+            assert isinstance(result, UniFiAPIResult)
+            assert "ok" == result.meta["rc"]
+
+        assert 4 == mock_list_all_devices_response.call_count
+        assert 1 == mock_login_response.call_count
+        assert 1 == unifi_api.reauth_count
+
+    @responses.activate
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_reauthenticate_single_flight(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
+        mock_login_response = responses.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            json={
+                "meta": {"rc": "ok"},
+                "data": [],
+            },
+            match=[matchers.header_matcher(RESPONSE_HEADER)],
+        )
+
+        generation: int = unifi_api.login_generation
+
+        # All callers got a 401 with the same session, only one of them logs in again.
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            logged_in: List[bool] = list(executor.map(lambda _: unifi_api.reauthenticate(generation), range(4)))
+
+        assert 1 == logged_in.count(True)
+        assert 1 == mock_login_response.call_count
+        assert 1 == unifi_api.reauth_count
+        assert generation + 1 == unifi_api.login_generation
+
+    @responses.activate
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_renew_session(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        mock_login_response = responses.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            json={
+                "meta": {"rc": "ok"},
+                "data": [],
+            },
+            match=[matchers.header_matcher(RESPONSE_HEADER)],
+        )
+
+        mock_async_login_response = respx.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            headers=RESPONSE_HEADER,
+        ).respond(json={"meta": {"rc": "ok"}, "data": []})
+
+        unifi_api.config.unifi_controller.session_ttl = 3600
+        unifi_api.login()
+
+        assert unifi_api.session_expires is not None
+        assert 3590 < unifi_api.session_expires - time.time() <= 3600
+
+        # The session expires within the renew margin, so it is renewed at once.
+        unifi_api.session_expires = time.time() + 30
+
+        async def run():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(unifi_api.renew_session(), timeout=0.5)
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert 1 == logs.count("[API] Renewing the session.")
+        assert 1 == mock_login_response.call_count
+        assert 1 == mock_async_login_response.call_count
+        assert 3590 < unifi_api.session_expires - time.time() <= 3600
+
+    @responses.activate
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_session_expires_from_cookie(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
+        expires: int = int(time.time()) + 600
+
+        responses.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            json={
+                "meta": {"rc": "ok"},
+                "data": [],
+            },
+            headers={"Set-Cookie": "TOKEN=MOCKED_TOKEN; Path=/; Max-Age=600"},
+        )
+
+        unifi_api.login()
+
+        assert unifi_api.session_expires is not None
+        assert expires - 5 <= unifi_api.session_expires <= expires + 5
+
+    @responses.activate
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_session_cache(
+        self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture, tmp_path: Path
+    ):
+        session_cache: Path = tmp_path / "session.json"
+        unifi_api.config.unifi_controller.session_cache = str(session_cache)
+
+        mock_login_response = responses.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            json={
+                "meta": {"rc": "ok"},
+                "data": [],
+            },
+            headers={"Set-Cookie": "unifises=MOCKED_SESSION; Path=/"},
+        )
+
+        # Without a cached session the API logs in and caches the session.
+        unifi_api.start_session()
+
+        assert 1 == mock_login_response.call_count
+        assert 0o600 == stat.S_IMODE(session_cache.stat().st_mode)
+        assert "MOCKED_SESSION" == json.loads(session_cache.read_text())["cookies"][0]["value"]
+
+        # A new API reuses the cached session.
+        mock_self_response = responses.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.SELF_ENDPOINT}",
+            json={
+                "meta": {"rc": "ok"},
+                "data": [],
+            },
+            match=[matchers.header_matcher({"Cookie": "unifises=MOCKED_SESSION"})],
+        )
+
+        cached_unifi_api: UniFiAPI = UniFiAPI(config=unifi_api.config)
+        cached_unifi_api.start_session()
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert "[API] Reusing cached session." in logs
+        assert 1 == mock_self_response.call_count
+        assert 1 == mock_login_response.call_count
+        assert "unifises=MOCKED_SESSION" == cached_unifi_api.cookies
+
+    @responses.activate
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_session_cache_expired(
+        self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture, tmp_path: Path
+    ):
+        session_cache: Path = tmp_path / "session.json"
+        session_cache.write_text(
+            json.dumps({"cookies": [{"name": "unifises", "value": "EXPIRED_SESSION"}], "csrf_token": ""})
+        )
+        unifi_api.config.unifi_controller.session_cache = str(session_cache)
+
+        mock_self_response = responses.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.SELF_ENDPOINT}",
+            json={
+                "meta": {"rc": "error", "msg": "api.err.LoginRequired"},
+                "data": [],
+            },
+            status=requests.codes.unauthorized,
+        )
+
+        mock_login_response = responses.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            json={
+                "meta": {"rc": "ok"},
+                "data": [],
+            },
+            headers={"Set-Cookie": "unifises=MOCKED_SESSION; Path=/"},
+        )
+
+        unifi_api.start_session()
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert "[API] Cached session expired." in logs
+        assert 1 == mock_self_response.call_count
+        assert 1 == mock_login_response.call_count
+        assert 0 == unifi_api.reauth_count
+        assert "MOCKED_SESSION" == json.loads(session_cache.read_text())["cookies"][0]["value"]
+
 
 class TestUnhappyPathUniFiApi(TestUniFiApi):
     @responses.activate
@@ -283,3 +614,102 @@ class TestUnhappyPathUniFiApi(TestUniFiApi):
 
         assert "[API] JSON decode error. API not available! Shutdown UniFi Tools." in logs
         assert 1 == len(logs)
+
+    @responses.activate
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_reconnect_once(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        mock_list_all_devices_failed_response = responses.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            json={
+                "meta": {
+                    "rc": "error",
+                    "msg": "api.err.LoginRequired",
+                },
+                "data": [],
+            },
+            status=requests.codes.unauthorized,
+        )
+
+        mock_login_response = responses.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            json={
+                "meta": {"rc": "ok"},
+                "data": [],
+            },
+        )
+
+        # The request is retried once after the login and does not recurse.
+        with pytest.raises(SystemExit):
+            unifi_api.list_all_devices()
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert "[API] 401 Client Error: Unauthorized for url: https://unifi.local/api/s/default/stat/device" in logs
+
+        assert 2 == mock_list_all_devices_failed_response.call_count
+        assert 1 == mock_login_response.call_count
+        assert 1 == unifi_api.reauth_count
+
+    @responses.activate
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_reauthenticate_login_unauthorized(
+        self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture
+    ):
+        mock_login_response = responses.post(
+            url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",
+            json={
+                "meta": {
+                    "rc": "error",
+                    "msg": "api.err.Invalid",
+                },
+                "data": [],
+            },
+            status=requests.codes.unauthorized,
+        )
+
+        unifi_api.config.unifi_controller.thread_pool = True
+
+        # E.g. the session renewal or the websocket logs in again and the controller rejects the login.
+        async def run():
+            await asyncio.wait_for(unifi_api.async_reauthenticate(unifi_api.login_generation), timeout=5)
+
+        loop = asyncio.new_event_loop()
+
+        # The failed login shuts down UniFi Tools instead of waiting for the login lock.
+        with pytest.raises(asyncio.CancelledError):
+            loop.run_until_complete(run())
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert "[API] 401 Client Error: Unauthorized for url: https://unifi.local/api/login" in logs
+
+        assert 1 == mock_login_response.call_count
+        assert 1 == unifi_api.rc
+        assert unifi_api._login_lock.acquire(timeout=5)
+
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_async_reauthenticate_login_unauthorized(
+        self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture
+    ):
+        mock_login_response = respx.post(url=f"{unifi_api.controller_url}{UniFiAPI.LOGIN_ENDPOINT}",).respond(
+            status_code=httpx.codes.UNAUTHORIZED,
+            json={"meta": {"rc": "error", "msg": "api.err.Invalid"}, "data": []},
+        )
+
+        async def run():
+            await unifi_api.async_reauthenticate(unifi_api.login_generation)
+            await asyncio.sleep(5)
+
+        loop = asyncio.new_event_loop()
+
+        # The rejected login is not retried and shuts down UniFi Tools.
+        with pytest.raises(asyncio.CancelledError):
+            loop.run_until_complete(asyncio.wait_for(run(), timeout=5))
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert "[API] 401 Client Error: Unauthorized for url: https://unifi.local/api/login" in logs
+
+        assert 1 == mock_login_response.call_count
+        assert 1 == unifi_api.rc
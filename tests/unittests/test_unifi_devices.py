@@ -1,60 +1,52 @@
+import asyncio
 import json
 from typing import Iterator
-from typing import Optional
+from typing import Set
 
 import pytest
-import responses
+import respx
 from _pytest.logging import LogCaptureFixture
-from responses import matchers
+from pytest_mock.plugin import MockerFixture
 
 from conftest import ConfigLoader
 from conftest_data import CONFIG_CONTENT
 from unifi_tools.features import FeatureConst
 from unifi_tools.features import FeaturePort
 from unifi_tools.unifi import UniFiAPI
+from unifi_tools.unifi import UniFiDeviceMap
 from unifi_tools.unifi import UniFiDevices
 from unifi_tools.unifi import UniFiPort
+from unifi_tools.unifi import UniFiPortStore
+from unifi_tools.unifi import UniFiPorts
+from unittests.plugins.test_features_data import devices_json_response_1
+from unittests.plugins.test_features_data import devices_json_response_2
 from unittests.test_unifi_api import TestUniFiApi
 from unittests.test_unifi_api_data import DEVICES_JSON_RESPONSE
 from unittests.test_unifi_api_data import DEVICES_NOT_ADOPTED_JSON_RESPONSE
 from unittests.test_unifi_api_data import RESPONSE_HEADER
+from unittests.test_unifi_devices_data import CONFIG_ALL_SITES_CONTENT
 from unittests.test_unifi_devices_data import FEATURE_MAP_REPR
+from unittests.test_unifi_devices_data import SITES_JSON_RESPONSE
 
 
 class TestHappyPathUniFiDevices(TestUniFiApi):
-    @responses.activate
     @pytest.fixture(autouse=True)
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
-    def setup(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
-        mock_response = responses.get(
-            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
-            json=json.loads(DEVICES_JSON_RESPONSE),
-            match=[matchers.header_matcher(RESPONSE_HEADER)],
-        )
-
-        responses.add(mock_response)
+    def setup(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, respx_mock: respx.MockRouter):
+        respx_mock.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(DEVICES_JSON_RESPONSE))
 
-    @responses.activate
-    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
-    def test_device_info(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
-        unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-        device_info: Optional[dict] = unifi_devices.get_device_info(device_id="MOCKED_DEVICE_ID")
-
-        logs: list = [record.getMessage() for record in caplog.records]
-
-        assert "[API] [ok] https://unifi.local/api/s/default/stat/device" in logs
-        assert 2 == len(logs)
-
-        assert isinstance(device_info, dict)
-        assert "MOCKED_DEVICE_ID" == device_info["_id"]
-
-    @responses.activate
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
     def test_scan(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
         unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
 
         assert 0 == len(unifi_devices.unifi_device_map)
-        unifi_devices.scan()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(unifi_devices.scan())
+
         assert 1 == len(unifi_devices.unifi_device_map)
 
         device = unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]
@@ -64,15 +56,75 @@ class TestHappyPathUniFiDevices(TestUniFiApi):
         assert "MOCKED SWITCH" == device["name"]
         assert "MOCKED MODEL" == device["model"]
         assert "MOCKED 6.2.14.13855" == device["version"]
-        assert 4 == len(device.keys())
+        assert "b4:fb:e4:b6:6f:12" == device["mac"]
+        assert "default" == device["site"]
+        assert 6 == len(device.keys())
+
+    @pytest.mark.parametrize("config_loader", [CONFIG_ALL_SITES_CONTENT], indirect=True)
+    def test_read_all_sites(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        site2_response: dict = json.loads(DEVICES_JSON_RESPONSE)
+        site2_response["data"][0].update({"_id": "SITE2_DEVICE_ID", "mac": "b4:fb:e4:b6:6f:13"})
+
+        respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.SITES_ENDPOINT}",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(SITES_JSON_RESPONSE))
+        mock_site2_response = respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='site2')}",
+            headers=RESPONSE_HEADER,
+        ).respond(json=site2_response)
+
+        unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(unifi_devices.read_devices())
+
+        logs: list = [record.getMessage() for record in caplog.records]
+
+        assert "[API] Found 2 sites." in logs
+        assert ["default", "site2"] == unifi_devices.sites
+        assert 1 == mock_site2_response.call_count
+
+        assert "default" == unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]["site"]
+        assert "site2" == unifi_devices.unifi_device_map["SITE2_DEVICE_ID"]["site"]
+        assert "site2" == unifi_devices.get_site("SITE2_DEVICE_ID")
+
+        features: Iterator[FeaturePort] = unifi_devices.features.by_feature_type([FeatureConst.PORT])
+        topics: Set[str] = {feature.topic for feature in features if feature.key[1] == 1}
+
+        # The site keeps the topics of both sites apart.
+        assert {"mocked_unifi/default-mocked_id-port-1", "mocked_unifi/site2-site2_device_id-port-1"} == topics
+
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_refresh_device(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
+        mock_get_device_response = respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}/b4:fb:e4:b6:6f:12",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(devices_json_response_1))
+
+        unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+        unifi_devices.unifi_device_map.initialise(json.loads(devices_json_response_2)["data"])
+        unifi_devices.unifi_device_map.pop_changed()
+
+        loop = asyncio.new_event_loop()
+
+        assert set() == loop.run_until_complete(unifi_devices.refresh_device(device_id="UNKNOWN_DEVICE_ID"))
+        assert {("MOCKED_DEVICE_ID", 1)} == loop.run_until_complete(
+            unifi_devices.refresh_device(device_id="MOCKED_DEVICE_ID")
+        )
+
+        assert "off" == unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]["ports"][1].poe_mode
+        assert 1 == mock_get_device_response.call_count
+        assert 0 == len(caplog.records)
 
-    @responses.activate
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
     def test_read_devices(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
         unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
 
         assert 0 == len(unifi_devices.features)
-        unifi_devices.read_devices()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(unifi_devices.read_devices())
 
         logs: list = [record.getMessage() for record in caplog.records]
 
@@ -92,24 +144,231 @@ class TestHappyPathUniFiDevices(TestUniFiApi):
         assert "MOCKED Port 1" == str(feature)
         assert {"poe_mode": "on"} == feature.value
 
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_get_port_overrides(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, mocker: MockerFixture):
+        mock_get_device_response = respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}/b4:fb:e4:b6:6f:12",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(devices_json_response_1))
+
+        mock_monotonic = mocker.patch("unifi_tools.unifi.time.monotonic", return_value=100.0)
+
+        unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+        unifi_devices.unifi_device_map.initialise(json.loads(devices_json_response_2)["data"])
+
+        loop = asyncio.new_event_loop()
+
+        port_overrides = loop.run_until_complete(unifi_devices.get_port_overrides(device_id="MOCKED_DEVICE_ID"))
+
+        assert "auto" == port_overrides[0]["poe_mode"]
+        assert 0 == mock_get_device_response.call_count
+
+        # The cached port overrides are too old, so the device is read again.
+        mock_monotonic.return_value = 161.0
+        port_overrides = loop.run_until_complete(unifi_devices.get_port_overrides(device_id="MOCKED_DEVICE_ID"))
+
+        assert "off" == port_overrides[0]["poe_mode"]
+        assert 1 == mock_get_device_response.call_count
+
+        assert [] == loop.run_until_complete(unifi_devices.get_port_overrides(device_id="UNKNOWN_DEVICE_ID"))
 
-class TestUnhappyPathUniFiDevices(TestUniFiApi):
-    @responses.activate
     @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
-    def test_device_info_not_adopted(self, config_loader: ConfigLoader, unifi_api: UniFiAPI, caplog: LogCaptureFixture):
-        mock_response = responses.get(
-            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT}",
-            json=json.loads(DEVICES_NOT_ADOPTED_JSON_RESPONSE),
-            match=[matchers.header_matcher(RESPONSE_HEADER)],
-        )
+    def test_update_port_coalesced(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
+        device_info: dict = json.loads(devices_json_response_1)["data"][0]
+        port_overrides: list = device_info["port_overrides"]
+
+        for port in port_overrides:
+            if port["port_idx"] in (1, 2):
+                port["poe_mode"] = "pasv24"
+
+        mock_update_device_response = respx.put(
+            url=f"{unifi_api.controller_url}{UniFiAPI.REST_DEVICE_ENDPOINT.format(site='default')}/MOCKED_DEVICE_ID",
+            headers=RESPONSE_HEADER,
+            json={"port_overrides": port_overrides},
+        ).respond(json=json.loads(devices_json_response_1))
+
+        mock_get_device_response = respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}/b4:fb:e4:b6:6f:12",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(devices_json_response_1))
 
-        responses.add(mock_response)
         unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
-        device_info: dict = unifi_devices.get_device_info(device_id="MOCKED_DEVICE_ID")
+        unifi_devices.unifi_device_map.initialise(json.loads(devices_json_response_1)["data"])
 
-        logs: list = [record.getMessage() for record in caplog.records]
+        async def run():
+            return await asyncio.gather(
+                unifi_devices.update_port(device_id="MOCKED_DEVICE_ID", port_idx=1, poe_mode="pasv24"),
+                unifi_devices.update_port(device_id="MOCKED_DEVICE_ID", port_idx=2, poe_mode="pasv24"),
+                # Port 3 already has this PoE mode.
+                unifi_devices.update_port(device_id="MOCKED_DEVICE_ID", port_idx=3, poe_mode="off"),
+            )
+
+        loop = asyncio.new_event_loop()
+
+        assert [True, True, False] == loop.run_until_complete(run())
+        assert 1 == mock_update_device_response.call_count
+        assert 1 == mock_get_device_response.call_count
+
+        # The written port overrides are kept, even if the device read back is not updated yet.
+        cached_port_overrides = unifi_devices.unifi_device_map.get_port_overrides("MOCKED_DEVICE_ID")
 
-        assert "[API] [ok] https://unifi.local/api/s/default/stat/device" in logs
-        assert 2 == len(logs)
+        assert cached_port_overrides == port_overrides
 
-        assert 0 == len(device_info)
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_update_port_unchanged_cfgversion(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
+        mock_update_device_response = respx.put(
+            url=f"{unifi_api.controller_url}{UniFiAPI.REST_DEVICE_ENDPOINT.format(site='default')}/MOCKED_DEVICE_ID",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(devices_json_response_2))
+
+        # Right after the PoE command the controller still returns the device with the old cfgversion.
+        mock_get_device_response = respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}/b4:fb:e4:b6:6f:12",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(devices_json_response_1))
+
+        unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+        unifi_devices.unifi_device_map.initialise(json.loads(devices_json_response_1)["data"])
+        unifi_devices.unifi_device_map.pop_changed()
+
+        loop = asyncio.new_event_loop()
+
+        assert True is loop.run_until_complete(
+            unifi_devices.update_port(device_id="MOCKED_DEVICE_ID", port_idx=1, poe_mode="auto")
+        )
+        assert 1 == mock_update_device_response.call_count
+        assert 1 == mock_get_device_response.call_count
+
+        # The new PoE mode is published with the next pass, not only after the next cfgversion.
+        assert "auto" == unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]["ports"][1].poe_mode
+        assert {("MOCKED_DEVICE_ID", 1)} == unifi_devices.unifi_device_map.pop_changed()
+
+
+class TestHappyPathUniFiDeviceMap:
+    def test_initialise_changed_ports(self):
+        unifi_device_map: UniFiDeviceMap = UniFiDeviceMap()
+
+        changed = unifi_device_map.initialise(json.loads(devices_json_response_2)["data"])
+        ports = unifi_device_map["MOCKED_DEVICE_ID"]["ports"]
+
+        assert {("MOCKED_DEVICE_ID", port_idx) for port_idx in ports.keys()} == changed
+        assert "auto" == ports[1].poe_mode
+
+        port_2: UniFiPort = ports[2]
+        row_2: int = ports.rows[2]
+
+        assert {("MOCKED_DEVICE_ID", 1)} == unifi_device_map.initialise(json.loads(devices_json_response_1)["data"])
+        assert set() == unifi_device_map.initialise(json.loads(devices_json_response_1)["data"])
+
+        assert "off" == ports[1].poe_mode
+        assert port_2 == ports[2]
+        assert row_2 == ports.rows[2]
+        assert len(ports) == len(unifi_device_map.ports)
+        assert ports is unifi_device_map["MOCKED_DEVICE_ID"]["ports"]
+
+        assert changed == unifi_device_map.pop_changed()
+        assert set() == unifi_device_map.pop_changed()
+
+        # A write outside of a scan is recorded as well.
+        assert True is ports.set(2, name=port_2.name, poe_mode="auto")
+        assert {("MOCKED_DEVICE_ID", 2)} == unifi_device_map.pop_changed()
+
+    def test_port_store(self):
+        store: UniFiPortStore = UniFiPortStore()
+        ports: UniFiPorts = UniFiPorts(store, "MOCKED_DEVICE_ID")
+
+        assert True is ports.set(3, name="MOCKED Port 3", poe_mode="auto")
+        assert True is ports.set(1, name="MOCKED Port 1", poe_mode="auto")
+        assert False is ports.set(1, name="MOCKED Port 1", poe_mode="auto")
+        assert True is ports.set(1, name="MOCKED Port 1", poe_mode="off")
+        assert {("MOCKED_DEVICE_ID", 1), ("MOCKED_DEVICE_ID", 3)} == ports.changed
+
+        assert [1, 3] == list(ports)
+        assert 2 == len(ports) == len(store)
+        assert UniFiPort(idx=1, name="MOCKED Port 1", poe_mode="off") == ports[1]
+        assert 2 not in ports
+
+        with pytest.raises(KeyError):
+            ports[26]
+
+        # PoE modes and names are stored once and referenced by code.
+        assert [None, "auto", "off"] == store.poe_modes
+        assert ["", "MOCKED Port 3", "MOCKED Port 1"] == store.names
+        assert ["MOCKED_DEVICE_ID"] == store.device_ids
+
+    def test_initialise_unchanged_cfgversion(self):
+        unifi_device_map: UniFiDeviceMap = UniFiDeviceMap()
+        unifi_device_map.initialise(json.loads(devices_json_response_2)["data"])
+
+        device_infos: list = json.loads(devices_json_response_1)["data"]
+        device_infos[0]["cfgversion"] = json.loads(devices_json_response_2)["data"][0]["cfgversion"]
+
+        assert set() == unifi_device_map.initialise(device_infos)
+        assert "auto" == unifi_device_map["MOCKED_DEVICE_ID"]["ports"][1].poe_mode
+
+    def test_update_ports(self):
+        unifi_device_map: UniFiDeviceMap = UniFiDeviceMap()
+        unifi_device_map.initialise(json.loads(devices_json_response_2)["data"])
+        unifi_device_map.pop_changed()
+
+        changed = unifi_device_map.update_ports(
+            [
+                {"_id": "UNKNOWN_DEVICE_ID", "port_overrides": [{"port_idx": 1, "poe_mode": "off"}]},
+                {"_id": "MOCKED_DEVICE_ID", "state": 1},
+                {"_id": "MOCKED_DEVICE_ID", "port_overrides": [{"port_idx": 1, "poe_mode": "off"}]},
+            ]
+        )
+
+        assert {("MOCKED_DEVICE_ID", 1)} == changed
+        assert changed == unifi_device_map.pop_changed()
+        assert "off" == unifi_device_map["MOCKED_DEVICE_ID"]["ports"][1].poe_mode
+
+        # The event had no cfgversion, so the next scan parses the device again.
+        assert {("MOCKED_DEVICE_ID", 1)} == unifi_device_map.initialise(json.loads(devices_json_response_2)["data"])
+
+    def test_get_port_overrides(self, mocker: MockerFixture):
+        unifi_device_map: UniFiDeviceMap = UniFiDeviceMap()
+
+        assert unifi_device_map.get_port_overrides("MOCKED_DEVICE_ID") is None
+
+        mock_monotonic = mocker.patch("unifi_tools.unifi.time.monotonic", return_value=100.0)
+        unifi_device_map.initialise(json.loads(devices_json_response_2)["data"])
+
+        port_overrides = unifi_device_map.get_port_overrides("MOCKED_DEVICE_ID", max_age=60)
+
+        assert isinstance(port_overrides, list)
+        assert "auto" == port_overrides[0]["poe_mode"]
+
+        # The snapshot is a copy, changes must not leak into the cache.
+        port_overrides[0]["poe_mode"] = "off"
+        port_overrides = unifi_device_map.get_port_overrides("MOCKED_DEVICE_ID")
+
+        assert isinstance(port_overrides, list)
+        assert "auto" == port_overrides[0]["poe_mode"]
+
+        mock_monotonic.return_value = 161.0
+
+        assert unifi_device_map.get_port_overrides("MOCKED_DEVICE_ID", max_age=60) is None
+        assert unifi_device_map.get_port_overrides("MOCKED_DEVICE_ID", max_age=0) is not None
+
+        # An unchanged cfgversion confirms the cached snapshot.
+        unifi_device_map.initialise(json.loads(devices_json_response_2)["data"])
+        assert unifi_device_map.get_port_overrides("MOCKED_DEVICE_ID", max_age=60) is not None
+
+
+class TestUnhappyPathUniFiDevices(TestUniFiApi):
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_scan_not_adopted(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
+        mock_response = respx.get(
+            url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+            headers=RESPONSE_HEADER,
+        ).respond(json=json.loads(DEVICES_NOT_ADOPTED_JSON_RESPONSE))
+
+        unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(unifi_devices.scan())
+
+        assert 1 == mock_response.call_count
+        assert 0 == len(unifi_devices.unifi_device_map)
@@ -3,3 +3,41 @@ from typing import Final
 FEATURE_MAP_REPR: Final[
     str
 ] = """FeatureMap({'port': [MOCKED Port 1, MOCKED Port 2, MOCKED Port 3, MOCKED Port 4, MOCKED Port 5, MOCKED Port 6, MOCKED Port 7, MOCKED Port 8, MOCKED Port 9, MOCKED Port 10, MOCKED Port 11, MOCKED Port 12, MOCKED Port 13, MOCKED Port 14, MOCKED Port 15, MOCKED Port 16, MOCKED Port 17, MOCKED Port 18, MOCKED Port 19, MOCKED Port 20, MOCKED Port 21, MOCKED Port 22, MOCKED Port 23, MOCKED Port 24, Port #25, Port #26]})"""
+
+CONFIG_ALL_SITES_CONTENT: Final[
+    str
+] = """device_info:
+  name: MOCKED_UNIFI
+unifi_controller:
+  url: localhost
+  port: 8443
+  username: username
+  password: password
+  all_sites: true
+  site_topics: true
+features:
+  MOCKED_DEVICE_ID:
+    id: MOCKED_ID
+logging:
+  level: debug
+"""
+
+SITES_JSON_RESPONSE: Final[
+    str
+] = """{
+  "meta": {
+    "rc": "ok"
+  },
+  "data": [
+    {
+      "_id": "MOCKED_SITE_ID_1",
+      "name": "default",
+      "desc": "Default"
+    },
+    {
+      "_id": "MOCKED_SITE_ID_2",
+      "name": "site2",
+      "desc": "Site 2"
+    }
+  ]
+}"""
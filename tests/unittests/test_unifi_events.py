@@ -0,0 +1,78 @@
+import asyncio
+import json
+from unittest.mock import PropertyMock
+
+import pytest
+import respx
+from _pytest.logging import LogCaptureFixture
+from pytest_mock.plugin import MockerFixture
+
+from conftest import ConfigLoader
+from conftest_data import CONFIG_CONTENT
+from unifi_tools.events import UniFiEvents
+from unifi_tools.unifi import UniFiAPI
+from unifi_tools.unifi import UniFiDevices
+from unittests.plugins.test_features_data import devices_json_response_1
+from unittests.plugins.test_features_data import devices_json_response_2
+from unittests.test_unifi_api import TestUniFiApi
+from unittests.test_unifi_api_data import RESPONSE_HEADER
+
+websockets = pytest.importorskip("websockets")
+
+
+class TestHappyPathUniFiEvents(TestUniFiApi):
+    @respx.mock
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_listen(
+        self, config_loader: ConfigLoader, unifi_api: UniFiAPI, mocker: MockerFixture, caplog: LogCaptureFixture
+    ):
+        async def handler(websocket):
+            await websocket.send("INVALID_JSON")
+            await websocket.send(json.dumps({"meta": {"rc": "ok", "message": "sta:sync"}, "data": []}))
+            await websocket.send(
+                json.dumps(
+                    {
+                        "meta": {"rc": "ok", "message": "device:sync"},
+                        "data": json.loads(devices_json_response_1)["data"],
+                    }
+                )
+            )
+
+        async def run():
+            respx.get(
+                url=f"{unifi_api.controller_url}{UniFiAPI.STATE_DEVICE_ENDPOINT.format(site='default')}",
+                headers=RESPONSE_HEADER,
+            ).respond(json=json.loads(devices_json_response_2))
+
+            unifi_devices: UniFiDevices = UniFiDevices(unifi_api=unifi_api)
+            await unifi_devices.read_devices()
+
+            assert "auto" == unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]["ports"][1].poe_mode
+
+            async with websockets.serve(handler, "localhost", 0) as server:
+                port: int = server.sockets[0].getsockname()[1]
+
+                events: UniFiEvents = UniFiEvents(unifi_devices)
+                events.url = f"ws://localhost:{port}{UniFiAPI.EVENTS_ENDPOINT.format(site='default')}"
+
+                await events.listen()
+
+                assert False is events.connected
+
+            assert "off" == unifi_devices.unifi_device_map["MOCKED_DEVICE_ID"]["ports"][1].poe_mode
+
+            logs: list = [record.getMessage() for record in caplog.records]
+
+            assert "[API] Connected to events websocket of site 'default'." in logs
+            assert "[API] Invalid websocket message: INVALID_JSON" in logs
+
+        mocker.patch.object(UniFiEvents, "LISTEN_RUNNING", new_callable=PropertyMock, side_effect=[True, False])
+        mocker.patch.object(UniFiEvents, "RECONNECT_INTERVAL", 0)
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run())
+
+    @pytest.mark.parametrize("config_loader", [CONFIG_CONTENT], indirect=True)
+    def test_events_url(self, config_loader: ConfigLoader, unifi_api: UniFiAPI):
+        assert "wss://unifi.local/wss/s/default/events" == unifi_api.events_url()
+        assert "wss://unifi.local/wss/s/site2/events" == unifi_api.events_url("site2")